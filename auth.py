@@ -1,4 +1,6 @@
 import os
+import time
+import functools
 import jwt
 from fastapi import HTTPException, Security, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -8,22 +10,41 @@ load_dotenv()
 
 security = HTTPBearer()
 
-# In a real production app, you would fetch Clerk's JWKS to verify signatures.
-# For this demo, we might trust the token structure or do a simple decoding if verified by gateway, 
-# but best practice is to verify. 
-# Since we are doing a demo, we will decode unverified to get the 'sub' (User ID) 
-# assuming usage behind a secure client or for simplicity. 
-# TODO: Implement proper JWKS verification for production.
+# Clerk session tokens are RS256-signed. The public keys are fetched from the
+# instance JWKS endpoint once and cached by PyJWKClient; verified payloads are
+# memoized per token so repeat requests skip the signature check entirely.
+CLERK_JWKS_URL = os.getenv("CLERK_JWKS_URL")
+CLERK_ISSUER = os.getenv("CLERK_ISSUER")
+
+jwks_client = jwt.PyJWKClient(CLERK_JWKS_URL, cache_keys=True) if CLERK_JWKS_URL else None
+
+@functools.lru_cache(maxsize=4096)
+def _decode(token: str) -> dict:
+    signing_key = jwks_client.get_signing_key_from_jwt(token)
+    return jwt.decode(
+        token,
+        signing_key.key,
+        algorithms=["RS256"],
+        issuer=CLERK_ISSUER,
+        options={"verify_aud": False, "verify_iss": bool(CLERK_ISSUER)}
+    )
 
 def get_current_user_id(credentials: HTTPAuthorizationCredentials = Security(security)):
+    if jwks_client is None:
+        raise HTTPException(status_code=500, detail="CLERK_JWKS_URL not set on server.")
+
     token = credentials.credentials
     try:
-        # DECODING WITHOUT VERIFICATION FOR DEMO SPEED as we don't have the PEM key handy instantly.
-        # In PROD: Use jwt.decode(token, key, algorithms=["RS256"]) using Clerk's public key.
-        payload = jwt.decode(token, options={"verify_signature": False})
-        user_id = payload.get("sub")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token payload")
-        return user_id
-    except Exception as e:
+        payload = _decode(token)
+    except Exception:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+
+    # Cached payloads were verified when first seen, so only expiry needs re-checking
+    exp = payload.get("exp")
+    if exp is not None and exp < time.time():
+        raise HTTPException(status_code=401, detail="Token has expired")
+
+    user_id = payload.get("sub")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid token payload")
+    return user_id
@@ -1,25 +1,30 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import func, distinct
 from database import SessionLocal
 import models
-import json
 
 def check_schools():
     db = SessionLocal()
     try:
-        schools = db.query(models.School).all()
-        print(f"Total Schools Registered: {len(schools)}")
+        # Classroom and student counts are aggregated in the same query
+        rows = db.query(
+            models.School,
+            func.count(distinct(models.Classroom.id)).label("classrooms_count"),
+            func.count(distinct(models.Student.id)).label("students_count")
+        ).outerjoin(
+            models.Classroom, models.Classroom.school_id == models.School.id
+        ).outerjoin(
+            models.Student, models.Student.school_id == models.School.id
+        ).group_by(models.School.id).all()
+
+        print(f"Total Schools Registered: {len(rows)}")
         print("-" * 50)
-        for school in schools:
+        for school, classrooms_count, students_count in rows:
             print(f"ID: {school.id}")
             print(f"Name: {school.name}")
             print(f"Email: {school.email}")
             print(f"Country: {school.country}")
             print(f"Education System: {school.education_system}")
             print(f"Created At: {school.created_at}")
-            
-            # Count students and classrooms
-            classrooms_count = len(school.classrooms)
-            students_count = len(school.students)
             print(f"Classrooms: {classrooms_count}")
             print(f"Students: {students_count}")
             print("-" * 50)
@@ -5,29 +5,31 @@ def clear_data():
     db_path = 'quizv2.db'
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
-    
-    # Disable foreign key checks to allow clearing tables in any order
-    cursor.execute("PRAGMA foreign_keys = OFF;")
-    
-    # Get all table names
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = cursor.fetchall()
-    
-    for table_name in tables:
-        table = table_name[0]
-        if table != 'sqlite_sequence': # Don't delete sequence data if we want to reset IDs we should, but usually safer to leave unless explicit
-            print(f"Clearing table: {table}")
-            cursor.execute(f"DELETE FROM {table};")
-            
-    # Reset auto-increment counters if sqlite_sequence exists
+
+    # Get all table names (sqlite_sequence is handled separately below)
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name != 'sqlite_sequence';")
+    tables = [row[0] for row in cursor.fetchall()]
+
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='sqlite_sequence';")
-    if cursor.fetchone():
-        cursor.execute("DELETE FROM sqlite_sequence;")
-            
-    conn.commit()
-    
-    # Re-enable foreign keys
-    cursor.execute("PRAGMA foreign_keys = ON;")
+    has_sequence = cursor.fetchone() is not None
+
+    for table in tables:
+        print(f"Clearing table: {table}")
+
+    # One script, one transaction: foreign key checks are disabled around it so
+    # tables can be cleared in any order, and auto-increment counters are reset.
+    statements = [f'DELETE FROM "{table}";' for table in tables]
+    if has_sequence:
+        statements.append("DELETE FROM sqlite_sequence;")
+
+    cursor.executescript(
+        "PRAGMA foreign_keys = OFF;\n"
+        "BEGIN;\n"
+        + "\n".join(statements)
+        + "\nCOMMIT;\n"
+        "PRAGMA foreign_keys = ON;"
+    )
+
     conn.close()
     print("Database cleared successfully.")
 
@@ -1,13 +1,40 @@
 from database import engine
 from models import Base
-from sqlalchemy import MetaData
+from sqlalchemy import MetaData, text
 
 # Reflect the database schema
 metadata = MetaData()
 metadata.reflect(bind=engine)
 
-# Connect and execute delete for each table
-with engine.begin() as conn:
-    for table in reversed(metadata.sorted_tables):
-        conn.execute(table.delete())
+tables = list(reversed(metadata.sorted_tables))
+quote = engine.dialect.identifier_preparer.quote
+
+if not tables:
+    print("No tables to clear.")
+elif engine.dialect.name == "postgresql":
+    # One statement wipes every table, follows FKs and resets identity sequences
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"TRUNCATE TABLE {', '.join(quote(t.name) for t in tables)} RESTART IDENTITY CASCADE"
+        ))
+    print("Database cleared successfully!")
+elif engine.dialect.name == "sqlite":
+    # All DELETEs in one script and one transaction on the raw sqlite3 connection
+    raw_conn = engine.raw_connection()
+    try:
+        raw_conn.driver_connection.executescript(
+            "PRAGMA foreign_keys = OFF;\n"
+            "BEGIN;\n"
+            + "\n".join(f"DELETE FROM {quote(t.name)};" for t in tables)
+            + "\nCOMMIT;\n"
+            "PRAGMA foreign_keys = ON;"
+        )
+    finally:
+        raw_conn.close()
+    print("Database cleared successfully!")
+else:
+    # Connect and execute delete for each table
+    with engine.begin() as conn:
+        for table in tables:
+            conn.execute(table.delete())
     print("Database cleared successfully!")
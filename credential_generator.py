@@ -5,16 +5,35 @@ Utility functions for generating student credentials.
 import secrets
 import string
 from datetime import datetime
+from typing import Optional
 
-def generate_student_id(school_id: int, student_count: int) -> str:
+def generate_student_id(school_id: int, student_count: int, year: Optional[int] = None) -> str:
     """
     Generate a unique student ID.
     Format: STU-{YEAR}-{SCHOOL_ID}-{COUNT}
     Example: STU-2024-001-00123
+    Pass `year` when generating a batch so the clock is read once by the caller.
     """
-    year = datetime.now().year
+    if year is None:
+        year = datetime.now().year
     return f"STU-{year}-{school_id:03d}-{student_count:05d}"
 
+SPECIAL_CHARS = "!@#$%^&*"
+PASSWORD_ALPHABET = string.ascii_letters + string.digits + SPECIAL_CHARS
+
+def _random_chars(alphabet: str, count: int) -> list:
+    """Draw characters uniformly from the alphabet using batched random bytes."""
+    chars = []
+    # Largest multiple of the alphabet size that fits in a byte; higher bytes are rejected to avoid modulo bias
+    limit = 256 // len(alphabet) * len(alphabet)
+    while len(chars) < count:
+        for b in secrets.token_bytes(count * 2):
+            if b < limit:
+                chars.append(alphabet[b % len(alphabet)])
+                if len(chars) == count:
+                    break
+    return chars
+
 def generate_password(length: int = 12) -> str:
     """
     Generate a secure random password.
@@ -25,12 +44,11 @@ def generate_password(length: int = 12) -> str:
         secrets.choice(string.ascii_uppercase),
         secrets.choice(string.ascii_lowercase),
         secrets.choice(string.digits),
-        secrets.choice("!@#$%^&*")
+        secrets.choice(SPECIAL_CHARS)
     ]
     
-    # Fill the rest with random characters
-    all_chars = string.ascii_letters + string.digits + "!@#$%^&*"
-    password_chars += [secrets.choice(all_chars) for _ in range(length - 4)]
+    # Fill the rest from a single batch of random bytes
+    password_chars += _random_chars(PASSWORD_ALPHABET, length - 4)
     
     # Shuffle to avoid predictable patterns
     secrets.SystemRandom().shuffle(password_chars)
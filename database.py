@@ -1,5 +1,7 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from dotenv import load_dotenv
@@ -9,19 +11,66 @@ load_dotenv()
 # Use PostgreSQL URL if available (for Render), otherwise fallback to local SQLite
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./quizv2.db")
 
+# Connections are pooled per process and reused across requests
+POOL_OPTIONS = {
+    "pool_size": 10,
+    "max_overflow": 20,
+    "pool_pre_ping": True,
+    # Replace connections older than an hour before the server or a proxy drops them
+    "pool_recycle": 3600,
+}
+
+# The async engine serves the read endpoints that run on the event loop, so it gets a larger pool
+ASYNC_POOL_OPTIONS = {**POOL_OPTIONS, "pool_size": 20, "max_overflow": 40}
+
+# asyncio drivers per backend
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run alongside a writer; NORMAL sync is safe under WAL.
+    # foreign_keys is left off: individual quizzes store an individual ID in quizzes.user_id,
+    # which would violate the users FK.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-64000")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+
 # SQLite needs "check_same_thread": False, but PostgreSQL doesn't like it.
 if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
     engine = create_engine(
-        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, **POOL_OPTIONS
+    )
+    async_engine = create_async_engine(
+        make_url(SQLALCHEMY_DATABASE_URL).set(drivername=ASYNC_DRIVERS["sqlite"]),
+        connect_args={"check_same_thread": False}, **ASYNC_POOL_OPTIONS
     )
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
 else:
     # Handle Render's potentially outdated postgres:// prefix (SQLAlchemy 1.4+ needs postgresql://)
     if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
         SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, **POOL_OPTIONS)
+
+    # asyncpg takes libpq's sslmode as its own "ssl" argument
+    async_url = make_url(SQLALCHEMY_DATABASE_URL)
+    async_connect_args = {}
+    if "sslmode" in async_url.query:
+        async_connect_args["ssl"] = async_url.query["sslmode"]
+        async_url = async_url.difference_update_query(["sslmode"])
+    async_engine = create_async_engine(
+        async_url.set(drivername=ASYNC_DRIVERS[async_url.get_backend_name()]),
+        connect_args=async_connect_args, **ASYNC_POOL_OPTIONS
+    )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# expire_on_commit=False: expired attributes can't be lazily reloaded on an AsyncSession
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -30,3 +79,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -4,48 +4,96 @@ Handles password hashing, JWT token generation, and verification.
 """
 
 import os
+import logging
+import time
+import functools
+import threading
 import jwt
 import bcrypt
-from datetime import datetime, timedelta
+from cachetools import TTLCache
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError, InvalidHashError
+from datetime import datetime, timedelta, timezone
 from fastapi import HTTPException, Security, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from dotenv import load_dotenv
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+# database loads .env on import, so it comes before the settings below are read
+import database
+import models
 
-load_dotenv()
+# Per-request auth tracing; enable with logging level DEBUG for this module
+logger = logging.getLogger(__name__)
 
 # Security scheme
 individual_security = HTTPBearer()
 
 # JWT Configuration
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-individual-secret-key-change-in-production")
+# Encoded once rather than by PyJWT on every encode/decode
+_SECRET_KEY_BYTES = SECRET_KEY.encode("utf-8")
 ALGORITHM = "HS256"
+MAX_TOKEN_LENGTH = 8192
 ACCESS_TOKEN_EXPIRE_HOURS = 24 * 30  # 30 days
+_EXPIRE_DELTA = timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
+
+# Argon2id tuned to roughly 50ms per hash; shared so parameters are parsed once
+password_hasher = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+
+# Argon2 hash of a random throwaway password, checked for unknown emails to equalise timing
+DUMMY_PASSWORD_HASH = "$argon2id$v=19$m=19456,t=2,p=1$e0nAwMGNL0mkOP/Ehkx6cw$S/oed+hahWlxhwI2BXyU4cUIv6BzCjNlujM4FL+8eh8"
 
 def hash_password(password: str) -> str:
-    """Hash a password using bcrypt."""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
+    """Hash a password using Argon2id."""
+    return password_hasher.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash."""
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    """Verify a password against its hash (Argon2id, or bcrypt for accounts created before the switch)."""
+    if hashed_password.startswith("$2"):
+        return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    try:
+        return password_hasher.verify(hashed_password, plain_password)
+    except (VerifyMismatchError, InvalidHashError):
+        return False
+
+def needs_rehash(hashed_password: str) -> bool:
+    """Whether a stored hash is bcrypt or uses outdated Argon2 parameters."""
+    if hashed_password.startswith("$2"):
+        return True
+    return password_hasher.check_needs_rehash(hashed_password)
+
+def create_individual_access_token(data: dict, now: datetime = None) -> str:
+    """
+    Create a JWT access token for individual users.
+    
+    Args:
+        data: Dictionary containing user data (must include 'sub' for user ID)
+        now: Issue time; pass one value when minting tokens in a batch
+    """
+    issued_at = now or datetime.now(timezone.utc)
+    return jwt.encode(
+        {**data, "exp": issued_at + _EXPIRE_DELTA, "type": "individual"},
+        _SECRET_KEY_BYTES,
+        algorithm=ALGORITHM
+    )
 
-def create_individual_access_token(data: dict) -> str:
-    """Create a JWT access token for individual users."""
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
-    to_encode.update({
-        "exp": expire,
-        "type": "individual"
-    })
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+@functools.lru_cache(maxsize=4096)
+def _decode(token: str) -> dict:
+    """Verify a token signature once; repeat requests with the same token hit the cache."""
+    return jwt.decode(token, _SECRET_KEY_BYTES, algorithms=[ALGORITHM])
 
 def decode_token(token: str) -> dict:
     """Decode and verify a JWT token."""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        # Junk is rejected before any decoding (failed decodes aren't memoized)
+        if len(token) > MAX_TOKEN_LENGTH or token.count(".") != 2:
+            raise jwt.DecodeError("Malformed token")
+        payload = _decode(token)
+        
+        # Cached payloads were verified when first seen, so only expiry needs re-checking
+        exp = payload.get("exp")
+        if exp is not None and exp < time.time():
+            raise jwt.ExpiredSignatureError("Signature has expired")
         
         # Verify token type
         if payload.get("type") != "individual":
@@ -56,52 +104,67 @@ def decode_token(token: str) -> dict:
         
         return payload
     except jwt.ExpiredSignatureError:
-        print("DEBUG AUTH: Individual token has expired", flush=True)
+        logger.debug("Individual token has expired")
         raise HTTPException(status_code=401, detail="Token has expired")
     except jwt.InvalidTokenError as e:
-        print(f"DEBUG AUTH: Invalid individual token error: {e}", flush=True)
+        logger.debug("Invalid individual token error: %s", e)
         raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
     except Exception as e:
-        print(f"DEBUG AUTH: Unexpected error during decode: {e}", flush=True)
+        logger.debug("Unexpected error during decode: %s", e)
         raise HTTPException(status_code=401, detail="Authentication error")
 
-from sqlalchemy.orm import Session
-import database
-import models
+# IDs of individuals recently confirmed to exist. A stale entry only lasts 60s,
+# and deletes evict immediately through the after_delete hook below.
+_existing_individuals = TTLCache(maxsize=10_000, ttl=60)
+_existing_individuals_lock = threading.Lock()
+
+@event.listens_for(models.Individual, "after_delete")
+def _forget_deleted_individual(mapper, connection, target):
+    with _existing_individuals_lock:
+        _existing_individuals.pop(target.id, None)
 
-def get_current_individual_id(
+async def get_current_individual_id(
     credentials: HTTPAuthorizationCredentials = Security(individual_security),
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_async_db)
 ) -> int:
     """
     Dependency to get the current authenticated individual ID.
     Verifies that the individual still exists in the database.
     """
     token = credentials.credentials
-    print(f"DEBUG AUTH: Received individual token: {token[:10]}...", flush=True)
+    logger.debug("Received individual token: %s...", token[:10])
     
     try:
         payload = decode_token(token)
     except HTTPException as e:
-        print(f"DEBUG AUTH: Individual token decoding failed: {e.detail}", flush=True)
+        logger.debug("Individual token decoding failed: %s", e.detail)
         raise e
     
     individual_id = payload.get("sub")
-    print(f"DEBUG AUTH: Decoded individual_id from token: {individual_id} (type: {type(individual_id)})", flush=True)
+    logger.debug("Decoded individual_id from token: %s (type: %s)", individual_id, type(individual_id))
     
     if not individual_id:
         raise HTTPException(status_code=401, detail="Invalid token payload: missing sub")
     
-    # Verify individual exists in DB
     try:
         iid_int = int(individual_id)
-        individual = db.query(models.Individual).filter(models.Individual.id == iid_int).first()
     except (ValueError, TypeError):
-        print(f"DEBUG AUTH: individual_id {individual_id} could not be cast to int", flush=True)
+        logger.debug("individual_id %s could not be cast to int", individual_id)
         raise HTTPException(status_code=401, detail="Invalid individual ID format in token")
     
+    with _existing_individuals_lock:
+        if iid_int in _existing_individuals:
+            return iid_int
+    
+    # Verify individual exists in DB
+    individual = (await db.execute(
+        select(models.Individual.id).where(models.Individual.id == iid_int)
+    )).first()
+    
     if not individual:
-        print(f"DEBUG AUTH: Individual with ID {individual_id} not found in database", flush=True)
+        logger.debug("Individual with ID %s not found in database", individual_id)
         raise HTTPException(status_code=401, detail=f"Individual account {individual_id} not found in DB")
     
+    with _existing_individuals_lock:
+        _existing_individuals[iid_int] = True
     return iid_int
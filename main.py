@@ -1,23 +1,41 @@
-from fastapi import FastAPI, Depends, HTTPException, status, File, UploadFile, Form
+from fastapi import FastAPI, Depends, HTTPException, status, File, UploadFile, Form, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from pydantic import BaseModel
-from typing import List, Optional, Any, Dict, Union
-import shutil
-from openai import OpenAI
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import insert, select, update, func, cast, extract, Integer, String
+from sqlalchemy.orm import Session, joinedload, selectinload, contains_eager, load_only, defer
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, ConfigDict
+from typing import List, Optional, Any, Dict, Tuple, Union
+from openai import OpenAI, DefaultHttpxClient
+import httpx
 import json
+import orjson
+import asyncio
+import random
+import threading
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import tempfile
+from pathlib import Path
+from functools import lru_cache
+from cachetools import LRUCache, TTLCache
 import os
 from google import genai
 from google.genai import types
+from google.genai import errors as genai_errors
 import datetime
 import models, database, auth
+import migrate
 import school_auth
 import individual_auth
 import re
-from education_systems import EDUCATION_SYSTEMS, get_available_countries, get_education_levels
+import string
+from education_systems import EDUCATION_SYSTEMS, get_available_countries, get_education_levels, get_education_systems_payload
 from credential_generator import generate_student_id, generate_password, generate_simple_password
 
-models.Base.metadata.create_all(bind=database.engine)
+# Create missing tables and bring older databases (SQLite or PostgreSQL) up to the current schema
+migrate.migrate()
 
 # DEBUG: Print environment info
 import os
@@ -26,7 +44,22 @@ print(f"DEBUG: STARTING APP", flush=True)
 print(f"DEBUG: PORT env var: {os.environ.get('PORT')}", flush=True)
 print(f"DEBUG: Current working directory: {os.getcwd()}", flush=True)
 
-app = FastAPI()
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson (several times faster than stdlib json).
+    Large list endpoints return it directly: FastAPI passes Response objects through
+    untouched, skipping its jsonable_encoder walk (orjson encodes datetimes natively).
+    """
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await close_ai_clients()
+    await database.async_engine.dispose()
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Configure CORS for frontend
 app.add_middleware(
@@ -88,11 +121,73 @@ class EvaluationResponse(BaseModel):
     score: str
     results: List[SubmissionResult]
 
+# Response schemas for Gemini structured output; the decoder is constrained to these,
+# so replies parse directly instead of going through clean_json_text.
+class QuizOptions(BaseModel):
+    A: str
+    B: str
+    C: str
+    D: str
+
+class GeneratedQuestion(BaseModel):
+    id: int
+    question: str
+    options: Optional[QuizOptions] = None
+    answer: str = ""
+
+class GeneratedQuiz(BaseModel):
+    topic: str
+    format: str
+    questions: List[GeneratedQuestion]
+
+# Practice quizzes are graded locally, so their questions carry the answer key
+class PracticeQuestion(GeneratedQuestion):
+    correct_answer: str
+
+class PracticeQuiz(GeneratedQuiz):
+    questions: List[PracticeQuestion]
+
+class QuestionEvaluation(BaseModel):
+    id: int
+    score: float
+    feedback: str
+
+class BatchEvaluation(BaseModel):
+    results: List[QuestionEvaluation]
+
 class DocumentResponse(BaseModel):
     id: int
     filename: str
     created_at: Any
 
+class AttemptHistoryItem(BaseModel):
+    id: int
+    quiz_topic: str
+    score: Optional[str] = None
+    timestamp: Optional[datetime.datetime] = None
+
+class StudentQuizListItem(BaseModel):
+    id: int
+    title: str
+    topic: str
+    quiz_format: str
+    num_questions: int
+    difficulty: Optional[str] = None
+    created_at: Optional[datetime.datetime] = None
+    due_date: str
+    status: str
+    attempted: bool
+    score: Optional[str] = None
+    time_limit: Optional[int] = None
+
+class StudentAttemptItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    quiz_topic: str
+    score: Optional[str] = None
+    completed_at: Optional[datetime.datetime] = None
+
 class GenerateQuizFromExistingRequest(BaseModel):
     document_id: int
     topic: str
@@ -163,124 +258,448 @@ class QuizSubmitRequest(BaseModel):
 
 # --- Helpers ---
 
+# One keep-alive connection pool per upstream, shared by every per-key SDK client,
+# so a new user's first call reuses warm TLS connections instead of opening its own pool.
+# The SDKs do not close injected HTTP clients; close_ai_clients() does it on shutdown.
+AI_HTTP_LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=100)
+AI_HTTP_TIMEOUT = 60.0
+_gemini_http = httpx.Client(limits=AI_HTTP_LIMITS, timeout=AI_HTTP_TIMEOUT)
+_gemini_async_http = httpx.AsyncClient(limits=AI_HTTP_LIMITS, timeout=AI_HTTP_TIMEOUT)
+_openrouter_http = DefaultHttpxClient(limits=AI_HTTP_LIMITS, timeout=AI_HTTP_TIMEOUT)
+
+# One SDK client is kept per API key and reused across requests.
+_gemini_clients = LRUCache(maxsize=256)
+_openrouter_clients = LRUCache(maxsize=256)
+_ai_clients_lock = threading.Lock()
+
 def get_gemini_client(api_key: str):
-    return genai.Client(api_key=api_key)
+    with _ai_clients_lock:
+        client = _gemini_clients.get(api_key)
+        if client is None:
+            client = _gemini_clients[api_key] = genai.Client(
+                api_key=api_key,
+                http_options=types.HttpOptions(
+                    httpx_client=_gemini_http,
+                    httpx_async_client=_gemini_async_http
+                )
+            )
+    return client
 
 def get_gemini_model_name(model_name: str = "gemini-3-flash-preview"):
     # Clean the model name
     return model_name.replace("models/", "")
 
+# Explicit Gemini context caches for the stable prompt prefix (document excerpt + rules) of the
+# school quiz calls. Caches live in the API key's project, so the key is part of the lookup.
+# Creating one costs a round-trip plus billed storage, so a prefix is sent inline (where implicit
+# prefix caching applies) until it repeats for the same key; only then is a cache created.
+# An empty name marks a prefix the API refused to cache, so it isn't retried every request.
+GEMINI_CONTEXT_CACHE_TTL = 3600
+GEMINI_CONTEXT_CACHE_MIN_CHARS = 4000  # roughly the model's minimum cacheable token count
+_gemini_context_caches = TTLCache(maxsize=1024, ttl=GEMINI_CONTEXT_CACHE_TTL - 60)
+_gemini_prefixes_seen = TTLCache(maxsize=4096, ttl=GEMINI_CONTEXT_CACHE_TTL)
+_pending_context_caches = set()
+_gemini_context_caches_lock = threading.Lock()
+
+def get_gemini_context_cache(client, api_key: str, model: str, cache_id: tuple, prefix: str) -> Optional[str]:
+    """Name of the explicit cache holding `prefix`, created when the prefix repeats; None to send it inline."""
+    if len(prefix) < GEMINI_CONTEXT_CACHE_MIN_CHARS:
+        return None
+    key = quiz_cache_key(api_key, model, *cache_id)
+    with _gemini_context_caches_lock:
+        name = _gemini_context_caches.get(key)
+        if name is not None:
+            return name or None
+        if key not in _gemini_prefixes_seen:
+            _gemini_prefixes_seen[key] = True
+            return None
+        # Another request is already creating this cache; don't wait for it
+        if key in _pending_context_caches:
+            return None
+        _pending_context_caches.add(key)
+    name = None
+    try:
+        name = client.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                contents=[prefix], ttl=f"{GEMINI_CONTEXT_CACHE_TTL}s"
+            )
+        ).name
+    except genai_errors.ClientError as e:
+        # Rate limits are transient; other client errors mean this prefix can't be cached
+        if e.code != 429:
+            name = ""
+    except Exception:
+        pass  # transient (server or network) failure; the next repeat tries again
+    finally:
+        with _gemini_context_caches_lock:
+            _pending_context_caches.discard(key)
+            if name is not None:
+                _gemini_context_caches[key] = name
+    return name or None
+
+def generate_with_cached_prefix(client, api_key: str, cache_id: tuple, prefix: str, tail: str):
+    """generate_content for `prefix + tail`, sending only the tail when the prefix is cached."""
+    model = get_gemini_model_name()
+    cache_name = get_gemini_context_cache(client, api_key, model, cache_id, prefix)
+    if cache_name:
+        try:
+            return client.models.generate_content(
+                model=model,
+                contents=tail,
+                config=types.GenerateContentConfig(cached_content=cache_name)
+            )
+        except genai_errors.ClientError as e:
+            if e.code != 404:
+                raise
+            # Expired or deleted on the server; forget it and send the prefix inline this time
+            with _gemini_context_caches_lock:
+                _gemini_context_caches.pop(quiz_cache_key(api_key, model, *cache_id), None)
+    return client.models.generate_content(model=model, contents=prefix + tail)
+
 def get_openrouter_client(api_key: str):
-    return OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=api_key,
-        timeout=60.0
-    )
+    with _ai_clients_lock:
+        client = _openrouter_clients.get(api_key)
+        if client is None:
+            client = _openrouter_clients[api_key] = OpenAI(
+                base_url="https://openrouter.ai/api/v1",
+                api_key=api_key,
+                timeout=AI_HTTP_TIMEOUT,
+                http_client=_openrouter_http
+            )
+    return client
+
+async def close_ai_clients():
+    """Close every cached SDK client and the shared connection pools; called on application shutdown."""
+    with _ai_clients_lock:
+        gemini_clients = list(_gemini_clients.values())
+        openrouter_clients = list(_openrouter_clients.values())
+        _gemini_clients.clear()
+        _openrouter_clients.clear()
+    for client in gemini_clients:
+        try:
+            await client.aio.aclose()
+            client.close()
+        except Exception as e:
+            print(f"Error closing Gemini client: {e}")
+    for client in openrouter_clients:
+        try:
+            client.close()
+        except Exception as e:
+            print(f"Error closing OpenRouter client: {e}")
+    _gemini_http.close()
+    await _gemini_async_http.aclose()
+    _openrouter_http.close()
+
+async def run_password_check(func, *args):
+    """Run a (deliberately slow) password hash or verify call on the dedicated hashing pool."""
+    return await asyncio.get_running_loop().run_in_executor(school_auth.password_pool, func, *args)
+
+def add_quiz_questions(db: Session, quiz_id: int, questions: List[Dict[str, Any]]) -> None:
+    """Insert a generated quiz's questions in one executemany round-trip (caller commits)."""
+    rows = [
+        {
+            "quiz_id": quiz_id,
+            "text": q["question"],
+            "options": q.get("options"),
+            "correct_answer": ""  # Not known yet
+        }
+        for q in questions
+    ]
+    if rows:
+        db.execute(insert(models.Question), rows)
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+def save_upload_to_temp(file: UploadFile) -> Tuple[str, str]:
+    """
+    Stream an upload to a uniquely named temp file in 1 MB chunks.
+    Returns the path and the SHA-256 of the contents, computed in the same pass.
+    Only the original extension is kept (parsers use it to detect the file type);
+    the client-supplied name never becomes part of the path.
+    """
+    suffix = Path(file.filename or "").suffix
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as f:
+        while chunk := file.file.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+            f.write(chunk)
+    return f.name, digest.hexdigest()
+
+def write_upload(file: UploadFile, path: str) -> str:
+    """Copy an upload to `path` in 1 MB chunks and return its SHA-256 (blocking; async callers run it in a thread)."""
+    digest = hashlib.sha256()
+    with open(path, "wb") as buffer:
+        while chunk := file.file.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+            buffer.write(chunk)
+    return digest.hexdigest()
+
+def read_text_file(path: str) -> str:
+    """Read a file as UTF-8 text, dropping undecodable bytes (blocking; run it in a thread)."""
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return f.read()
+
+# Patterns used by clean_json_text, compiled once at import
+_RE_JSON_BRACE_OR_STRING = re.compile(r'"(?:[^"\\]|\\.)*"|[{}]')
+_RE_TRAILING_COMMA = re.compile(r',\s*([\]}])')
+_RE_LINE_COMMENT = re.compile(r'//.*?\n')
+_RE_PY_LITERAL = re.compile(r':\s*\b(None|True|False)\b')
+_PY_TO_JSON_LITERAL = {"None": ": null", "True": ": true", "False": ": false"}
+
+def _json_fence_bounds(text: str) -> Tuple[int, int]:
+    """Bounds of the first fenced block (preferring ```json), or the whole text if unfenced."""
+    lo, hi = 0, len(text)
+    fence = text.find("```json")
+    if fence != -1:
+        lo = fence + 7
+    else:
+        fence = text.find("```")
+        if fence != -1:
+            lo = fence + 3
+            if text.startswith("json", lo):
+                lo += 4
+    if fence != -1:
+        close = text.find("```", lo)
+        if close != -1:
+            hi = close
+    return lo, hi
+
+def _matching_brace(text: str, start: int, hi: int) -> int:
+    """Index of the '}' closing the '{' at `start`, skipping braces inside strings; -1 if unclosed."""
+    depth = 0
+    for m in _RE_JSON_BRACE_OR_STRING.finditer(text, start, hi):
+        token = m.group()
+        if token == "{":
+            depth += 1
+        elif token == "}":
+            depth -= 1
+            if depth == 0:
+                return m.start()
+    return -1
 
 def clean_json_text(text: str) -> str:
-    # Remove markdown code blocks if present
-    text = text.strip()
-    if "```json" in text:
-        text = text.split("```json")[1].split("```")[0]
-    elif "```" in text:
-        # Search for any code block that might contain JSON
-        blocks = re.findall(r'```(?:json)?\s*(.*?)\s*```', text, re.DOTALL)
-        if blocks:
-            text = blocks[0]
-        else:
-            text = text.split("```")[1].split("```")[0]
-    
-    # Remove any leading/trailing non-JSON characters
-    text = text.strip()
-    start = text.find('{')
+    # Slice the first balanced {...} object out of the first fenced block in one scan
+    lo, hi = _json_fence_bounds(text)
+    start = text.find('{', lo, hi)
     # If no start brace, return empty (unfixable)
     if start == -1:
         return ""
         
-    # Find the last closing brace. If it's missing or after the last content, 
-    # we might need to append it (truncated JSON)
-    end = text.rfind('}')
-    if end == -1 or end < start:
-        # Basic attempt to close truncated JSON
-        text = text[start:] + "\n  ]\n}"
+    # If the object never closes the JSON was probably truncated, so attempt to close it
+    end = _matching_brace(text, start, hi)
+    if end == -1:
+        text = text[start:hi].rstrip() + "\n  ]\n}"
     else:
         text = text[start:end+1]
     
     # Remove trailing commas before closing brackets/braces
-    text = re.sub(r',\s*([\]}])', r'\1', text)
+    text = _RE_TRAILING_COMMA.sub(r'\1', text)
     # Remove single-line comments
-    text = re.sub(r'//.*?\n', '\n', text)
-    # Fix Python-style None/True/False
-    text = re.sub(r':\s*None', ': null', text)
-    text = re.sub(r':\s*\bTrue\b', ': true', text)
-    text = re.sub(r':\s*\bFalse\b', ': false', text)
+    text = _RE_LINE_COMMENT.sub('\n', text)
+    # Fix Python-style None/True/False in one pass
+    text = _RE_PY_LITERAL.sub(lambda m: _PY_TO_JSON_LITERAL[m.group(1)], text)
         
     return text.strip()
 
-def get_actual_model_id(model_name: str) -> str:
+def _dumps(obj: Any, indent: bool = False) -> str:
+    """Serialize prompt payloads with orjson."""
+    option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+    return orjson.dumps(obj, option=option).decode()
+
+def _loads(text: str) -> Any:
+    """Parse with orjson, falling back to the lenient stdlib parser for raw control characters."""
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        # strict=False allows literal control characters like unescaped newlines in strings
+        return json.loads(text, strict=False)
+
+def json_output_config(schema: type, temperature: Optional[float] = None) -> types.GenerateContentConfig:
+    """Gemini config that constrains the reply to a Pydantic schema."""
+    return types.GenerateContentConfig(
+        temperature=temperature,
+        response_mime_type="application/json",
+        response_schema=schema,
+    )
+
+def parsed_response(response) -> Any:
+    """Structured-output reply as plain data; falls back to parsing the raw text."""
+    if response.parsed is not None:
+        return response.parsed.model_dump()
+    return parse_model_json(response.text)
+
+def parse_model_json(text: str) -> Any:
     """
-    Extract actual OpenRouter model ID from display names.
-    Handles cases where UI stores names like "Xiaomi Mimo V2 Flash (Free) - Recommended"
-    instead of the actual model ID "xiaomi/mimo-v2-flash:free"
+    Parse JSON out of a model response.
+    The first balanced object (bare or inside a code fence) is parsed directly;
+    the clean_json_text repairs only run when that fails.
     """
-    # Model ID mapping for common display names
-    model_mapping = {
+    lo, hi = _json_fence_bounds(text)
+    start = text.find("{", lo, hi)
+    end = _matching_brace(text, start, hi) if start != -1 else -1
+    if end != -1:
+        try:
+            return _loads(text[start:end + 1])
+        except ValueError:
+            pass
+    return _loads(clean_json_text(text))
+
+# ASCII case-folding table, built once; applied in a single translate() pass
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+def normalize_answer(answer: Any) -> str:
+    """Normalize an answer for exact-match grading (case and surrounding whitespace ignored)."""
+    if answer is None:
+        return ""
+    text = str(answer)
+    if text.isascii():
+        return text.translate(_ASCII_LOWER).strip()
+    return text.lower().strip()
+
+DEFAULT_OPENROUTER_MODEL = "xiaomi/mimo-v2-flash:free"
+
+# Display-name suffixes like "(Free) - Recommended"
+_RE_MODEL_NAME_SUFFIX = re.compile(r'\s*\(.*$|\s*-\s*recommended.*$', re.IGNORECASE)
+
+def _normalize_model_name(model_name: str) -> str:
+    return _RE_MODEL_NAME_SUFFIX.sub('', model_name.strip().lower())
+
+# Model ID mapping for common display names, keyed by normalized name
+_MODEL_ALIASES = {
+    _normalize_model_name(name): model_id
+    for name, model_id in {
         "xiaomi mimo v2 flash": "xiaomi/mimo-v2-flash:free",
         "xiaomi/mimo-v2-flash": "xiaomi/mimo-v2-flash:free",
         "qwen/qwen-2.5-7b-instruct": "qwen/qwen-2.5-7b-instruct:free",
         "meta-llama/llama-3.2-3b-instruct": "meta-llama/llama-3.2-3b-instruct:free",
-    }
-    
-    # Clean the model name (lowercase, remove extra text)
-    cleaned = model_name.lower().strip()
-    
-    # Remove common suffixes like "(Free) - Recommended"
-    cleaned = cleaned.split('(')[0].strip()
-    cleaned = cleaned.split('-')[0].strip() if 'recommended' in model_name.lower() else cleaned
-    
-    # Check if it's already a valid model ID format (contains /)
+    }.items()
+}
+
+def get_actual_model_id(model_name: str) -> str:
+    """
+    Extract actual OpenRouter model ID from display names.
+    Handles cases where UI stores names like "Xiaomi Mimo V2 Flash (Free) - Recommended"
+    instead of the actual model ID "xiaomi/mimo-v2-flash:free"
+    """
+    # Check if it's already a valid model ID format (vendor/model:variant)
     if '/' in model_name and ':' in model_name:
         return model_name
     
-    # Try to find in mapping
-    for key, value in model_mapping.items():
-        if key in cleaned:
-            return value
-    
-    # Default fallback
-    return "xiaomi/mimo-v2-flash:free"
+    return _MODEL_ALIASES.get(_normalize_model_name(model_name), DEFAULT_OPENROUTER_MODEL)
 
-def build_quiz_prompt(topic: str, quiz_format: str, num_questions: int, difficulty: str) -> str:
-    options_instruction = ""
-    if quiz_format == "multiple_choice" or quiz_format == "objective":
-        options_instruction = "options MUST include A, B, C, D keys mapped to answer text."
-    elif quiz_format in ["theory", "fill_in_the_blank"]:
-        options_instruction = "options MUST be null."
+# Large quizzes are generated and graded as several smaller concurrent calls;
+# the semaphore caps in-flight Gemini requests per process to stay within rate limits.
+GENERATION_BATCH_SIZE = 10
+EVAL_BATCH_SIZE = 5
+AI_MAX_CONCURRENCY = 8
+_ai_semaphore = asyncio.Semaphore(AI_MAX_CONCURRENCY)
 
-    return f"""
-    Generate a high-quality assessment about "{topic}".
-    Format: {quiz_format}
-    Difficulty: {difficulty}
-    Number of questions: {num_questions}
-    
+# Generated quizzes keyed on their normalized request parameters, so repeat requests for
+# the same topic/document and settings are served without another model call.
+# Entries are stored as orjson bytes so callers always get a fresh, mutable copy.
+_quiz_cache = TTLCache(maxsize=512, ttl=3600)
+_quiz_cache_lock = threading.Lock()
+
+def _normalize_cache_part(part: Any) -> Any:
+    if part is None:
+        return ""
+    if isinstance(part, str):
+        return " ".join(part.lower().split())
+    return part
+
+def quiz_cache_key(*parts: Any) -> str:
+    """Hash request parameters into a cache key; text is case- and whitespace-insensitive."""
+    normalized = [_normalize_cache_part(p) for p in parts]
+    return hashlib.blake2b(orjson.dumps(normalized), digest_size=16).hexdigest()
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def get_cached_quiz(key: str) -> Optional[Dict[str, Any]]:
+    with _quiz_cache_lock:
+        cached = _quiz_cache.get(key)
+    return orjson.loads(cached) if cached is not None else None
+
+def cache_quiz(key: str, quiz_json: Dict[str, Any]) -> None:
+    if not quiz_json.get("questions"):
+        return
+    data = orjson.dumps(quiz_json)
+    with _quiz_cache_lock:
+        _quiz_cache[key] = data
+
+# Raw model replies for exact prompts (theory grading, progress analysis). The prompt embeds
+# the answers or attempt history, so any new input produces a new key.
+_ai_response_cache = TTLCache(maxsize=2048, ttl=86400)
+_ai_response_cache_lock = threading.Lock()
+
+def ai_response_cache_key(model: str, *prompt_parts: str) -> str:
+    return hashlib.sha256(orjson.dumps([model, *prompt_parts])).hexdigest()
+
+def get_cached_ai_text(key: str) -> Optional[str]:
+    with _ai_response_cache_lock:
+        return _ai_response_cache.get(key)
+
+def cache_ai_text(key: str, text: str) -> None:
+    with _ai_response_cache_lock:
+        _ai_response_cache[key] = text
+
+# key -> [lock, holders]; identical concurrent requests wait for the first one's
+# result instead of each calling the model. Entries are dropped once unused.
+_quiz_generation_locks: Dict[str, list] = {}
+
+@asynccontextmanager
+async def quiz_generation_lock(key: str):
+    entry = _quiz_generation_locks.get(key)
+    if entry is None:
+        entry = _quiz_generation_locks[key] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            _quiz_generation_locks.pop(key, None)
+
+# Static instruction blocks placed at the start of every quiz prompt. Keeping the
+# byte-identical rules first and the per-request topic/settings (and document
+# text) last lets Gemini's implicit prefix caching reuse the shared part.
+_QUIZ_JSON_FORMAT = """
     Return ONLY a raw JSON object. NO markdown.
     The JSON format MUST be EXACTLY:
-    {{
-      "topic": "{topic}",
-      "format": "{quiz_format}",
+    {
+      "topic": "the requested topic",
+      "format": "the requested format",
       "questions": [
-        {{
+        {
+          "id": 1,
+          "question": "string",
+          "options": object or null, 
+          "answer": ""
+        }
+      ]
+    }
+"""
+
+_PRACTICE_QUIZ_RULES_PREFIX = """
+    Return ONLY a raw JSON object. NO markdown.
+    The JSON format MUST be EXACTLY:
+    {
+      "topic": "the requested topic",
+      "format": "the requested format",
+      "questions": [
+        {
           "id": 1,
           "question": "string",
           "options": object or null, 
           "answer": null,
           "correct_answer": "correct answer text or key"
-        }}
+        }
       ]
-    }}
+    }
     
     Rules:
-    - {options_instruction}
     - answer field MUST be null (it will be filled by user).
     - correct_answer field MUST be the actual correct answer (key or text).
     - For multiple choice, randomize correct answer position.
@@ -288,24 +707,147 @@ def build_quiz_prompt(topic: str, quiz_format: str, num_questions: int, difficul
     - CRITICAL: Focus on ACTUAL CONTENT and CONCEPTS.
     - NEGATIVE CONSTRAINTS: Do NOT ask about the author, publication date, document metadata, IEEE membership, or administrative details.
     - CRITICAL: ESCAPE all double quotes (") inside question strings with a backslash (\") or use single quotes instead.
-    - CRITICAL: Ensure the JSON is valid and not truncated.
+    - CRITICAL: Ensure the JSON is valid and not truncated."""
+
+_TOPIC_QUIZ_RULES_PREFIX = _QUIZ_JSON_FORMAT + """
+    Rules:
+    - answer field MUST be null (user input initially).
+    - correct_answer field MUST contain the correct answer.
+    - Randomize the position of the correct answer (A, B, C, D). Do NOT default to 'B', 'C', or 'D'.
+    - Ask and generate questions from random parts.
+    - ensure unique IDs for questions (1, 2, 3...)
+    - Focus ONLY on the SUBJECT MATTER and CONTENT.
+    - NEGATIVE CONSTRAINTS: Do NOT ask about authors, publication dates, publishers, or document metadata (e.g., 'Who is the corresponding author?', 'What is the date of publication?'). These are NOT reasonable questions. Focus on concepts, logic, and core information."""
+
+_DOCUMENT_QUIZ_RULES_PREFIX = _QUIZ_JSON_FORMAT + """
+    Rules:
+    - Questions MUST be answered using the provided DOCUMENT CONTEXT.
+    - Randomize the position of the correct answer (A, B, C, D). Do NOT default to 'B', 'C', or 'D'.
+    - Ask and generate questions from random parts of the document, do not ask questions from starting to ending - you can start asking questions from the middle of the document, from chapter 2, or from bullet points mentioned in the document.
+    - ENSURE questions are distributed across the ENTIRE text provided.
+    - answer field MUST always be an empty string (user will fill it).
+    - ensure unique IDs for questions (1, 2, 3...)
+    - NEGATIVE CONSTRAINTS: Do NOT ask about authors, publication dates, publishers, journals, or document structure (e.g., 'Who is the corresponding author?', 'Date of current version', 'matriculation number', 'what is after chapter 1'). These are NOT reasonable questions for understanding. Focus ONLY on the SUBJECT MATTER and CONTENT of the document.
+"""
+
+def _escape_braces(text: str) -> str:
+    return text.replace("{", "{{").replace("}", "}}")
+
+# Full prompt templates, assembled once at import; requests only fill the placeholders
+# with format_map. The rule prefixes contain literal JSON braces, hence the escaping.
+_PRACTICE_QUIZ_PROMPT = _escape_braces(_PRACTICE_QUIZ_RULES_PREFIX) + """
+    - {options_instruction}
+    
+    Task:
+    Generate a high-quality assessment about "{topic}".
+    Format: {format}
+    Difficulty: {difficulty}
+    Number of questions: {num_questions}
+    """
+
+_TOPIC_QUIZ_PROMPT = _escape_braces(_TOPIC_QUIZ_RULES_PREFIX) + """
+    - {options_instruction}
+    
+    Task:
+    Generate a high-fidelity assessment about "{topic}".
+    Format: {format}
+    Difficulty: {difficulty}
+    {difficulty_instruction}
+    Number of questions: {num_questions}
+    Custom Instructions: {custom_instructions}
     """
 
-async def generate_quiz_questions_ai(prompt: str, api_key: str) -> List[Dict[str, Any]]:
+_DOCUMENT_QUIZ_PROMPT = _escape_braces(_DOCUMENT_QUIZ_RULES_PREFIX) + """
+    DOCUMENT CONTEXT:
+    {context_text}
+    
+    ----------------
+    
+    Task:
+    Generate a high-fidelity, concept-focused assessment about "{topic}" based on the DOCUMENT CONTEXT above.
+    Generate {num_questions} questions.
+    Format: {format}
+    Difficulty: {difficulty}
+    Custom Instructions: {custom_instructions}
+    - {difficulty_instruction}
+    - {options_instruction}
+    """
+
+# Student quiz prompt: the document excerpt and rules only depend on the document and
+# format, so they form the (cacheable) prefix; the per-quiz request follows in the tail.
+_STUDENT_QUIZ_PREFIX = """
+    Context from document:
+    {doc_content}
+    
+    Return ONLY valid JSON in this format:
+    {{
+      "questions": [
+        {{
+          "id": 1,
+          "text": "Question text",
+          "type": "objective", # MUST match the format requested
+          "options": ["Option 1", "Option 2", "Option 3", "Option 4"], 
+          "correct_answer": "Exact text of the correct option"
+        }}
+      ]
+    }}
+    STRICT RULES:
+    1. STRICT FORMAT ADHERENCE: You MUST ONLY generate questions for the requested format "{quiz_format}". DO NOT MIX TYPES.
+    2. If format is "objective" or "Multiple Choice": Every question MUST be multiple choice with 4 distinct options. The "type" MUST be "objective".
+    3. If format is "theory" or "subjective" or "Free Text": Every question MUST be open-ended. The "options" MUST be null. The "type" MUST be "theory". The "correct_answer" MUST be a detailed model answer for evaluation.
+    4. If format is "fill in the blank": Every question MUST have a sentence with a missing word/phrase indicated by "____". The "type" MUST be "fill_in_the_blank". The "options" MUST be null. The "correct_answer" MUST be the exact word/phrase.
+    5. No markdown. No comments. No extra text.
+    """
+
+_STUDENT_QUIZ_TAIL = """
+    Create a {difficulty} difficulty quiz about {topic}.
+    Format: {quiz_format}
+    Number of questions: {num_questions}
+    
+    Additional Notes: {additional_notes}
+    """
+
+# Per-format and per-difficulty prompt lines; unknown values get an empty line
+_OPTIONS_INSTR = {
+    "objective": "options MUST include A, B, C, D keys mapped to answer text.",
+    "multiple_choice": "options MUST include A, B, C, D keys mapped to answer text.",
+    "theory": "options MUST be null.",
+    "fill_in_the_blank": "options MUST be null.",
+}
+
+_TOPIC_DIFFICULTY_INSTR = {
+    "easy": "Focus on high-level definitions and key terms. Keep questions simple and direct.",
+    "medium": "Focus on core concepts, relationships, and practical applications.",
+    "hard": "Focus on critical analysis, logical inferences, and complex problem-solving. Avoid surface-level facts. Ask 'why' and 'how' questions that probe deep understanding.",
+}
+
+_DOCUMENT_DIFFICULTY_INSTR = {
+    "easy": "Focus on high-level definitions and key terms. Keep questions simple and direct.",
+    "medium": "Extract questions from the beginning, middle, and end. Focus on core concepts and relationships.",
+    "hard": "Focus on subtle details, logical inferences, and complex scenarios found deep in the text. Ignore obvious surface-level facts. Ask 'why' and 'how'.",
+}
+
+def build_quiz_prompt(topic: str, quiz_format: str, num_questions: int, difficulty: str) -> str:
+    return _PRACTICE_QUIZ_PROMPT.format_map({
+        "options_instruction": _OPTIONS_INSTR.get(quiz_format, ""),
+        "topic": topic,
+        "format": quiz_format,
+        "difficulty": difficulty,
+        "num_questions": num_questions,
+    })
+
+async def generate_quiz_questions_ai(prompt: str, api_key: str, context: Optional[str] = None) -> List[Dict[str, Any]]:
     client = get_gemini_client(api_key)
     content = ""
     try:
-        response = client.models.generate_content(
+        response = await client.aio.models.generate_content(
             model=get_gemini_model_name(),
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                temperature=0.7,
-            )
+            # Source material goes in as its own part rather than being copied into every prompt
+            contents=[prompt, context] if context else prompt,
+            config=json_output_config(PracticeQuiz, temperature=0.7)
         )
         content = response.text
-        cleaned_json = clean_json_text(content)
-        # Use strict=False to allow literal control characters like unescaped newlines in JSON strings
-        data = json.loads(cleaned_json, strict=False)
+        data = parsed_response(response)
         return data.get("questions", [])
     except Exception as e:
         print(f"AI Generation Error: {e}")
@@ -318,25 +860,118 @@ async def generate_quiz_questions_ai(prompt: str, api_key: str) -> List[Dict[str
                 print(f"END: ...{content[-500:]}")
         return []
 
-async def evaluate_submission_ai(questions: List[Dict], answers: Dict[str, str], api_key: str) -> Dict[str, Any]:
+def split_question_batches(num_questions: int, batch_size: int = GENERATION_BATCH_SIZE) -> List[int]:
+    """Split a question count into near-equal batch sizes, e.g. 23 -> [8, 8, 7]."""
+    if num_questions <= 0:
+        return []
+    batches = -(-num_questions // batch_size)
+    base, extra = divmod(num_questions, batches)
+    return [base + 1] * extra + [base] * (batches - extra)
+
+async def generate_quiz_questions_batched(prompts: List[str], api_key: str, context: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Run one generation prompt per batch concurrently and merge the questions with fresh 1..N IDs."""
+    async def run(prompt: str) -> List[Dict[str, Any]]:
+        async with _ai_semaphore:
+            return await generate_quiz_questions_ai(prompt, api_key, context)
+
+    batches = await asyncio.gather(*(run(p) for p in prompts))
+    questions = [q for batch in batches for q in batch]
+    for i, q in enumerate(questions, 1):
+        q["id"] = i
+    return questions
+
+# Document quizzes are generated per excerpt: the text is cut into overlapping windows
+# of roughly DOCUMENT_CHUNK_TOKENS and the questions are spread over up to
+# MAX_DOCUMENT_WINDOWS of them, one picked from each equal stretch of the document, so
+# questions cover the whole document instead of its first 15k characters. Token counts
+# are estimated from length (about 4 characters per token for English text), which is
+# close enough for sizing prompt windows.
+DOCUMENT_CHUNK_TOKENS = 2000
+DOCUMENT_CHUNK_OVERLAP_TOKENS = 200
+MAX_DOCUMENT_WINDOWS = 10
+_CHARS_PER_TOKEN = 4
+
+def chunk_document(text: str, chunk_tokens: int = DOCUMENT_CHUNK_TOKENS, overlap_tokens: int = DOCUMENT_CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """Split text into overlapping windows, breaking on paragraph, line or word boundaries."""
+    size = chunk_tokens * _CHARS_PER_TOKEN
+    overlap = overlap_tokens * _CHARS_PER_TOKEN
+    chunks = []
+    start, length = 0, len(text)
+    while start < length:
+        end = min(start + size, length)
+        if end < length:
+            # Back up to the last natural break in the second half of the window
+            for sep in ("\n\n", "\n", " "):
+                cut = text.rfind(sep, start + size // 2, end)
+                if cut != -1:
+                    end = cut + len(sep)
+                    break
+        chunks.append(text[start:end])
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+def build_document_quiz_prompt(context_text: str, topic: str, quiz_format: str, num_questions: int, difficulty: str,
+                               custom_instructions: Optional[str], difficulty_instruction: str, options_instruction: str) -> str:
+    return _DOCUMENT_QUIZ_PROMPT.format_map({
+        "context_text": context_text,
+        "topic": topic,
+        "num_questions": num_questions,
+        "format": quiz_format,
+        "difficulty": difficulty,
+        "custom_instructions": custom_instructions or "None",
+        "difficulty_instruction": difficulty_instruction,
+        "options_instruction": options_instruction,
+    })
+
+async def generate_document_quiz(client, context_text: str, topic: str, quiz_format: str, num_questions: int, difficulty: str,
+                                 custom_instructions: Optional[str], difficulty_instruction: str, options_instruction: str) -> Dict[str, Any]:
     """
-    Evaluates quiz submission using AI.
-    Returns: { "score": "X/Y", "results": [ { "id": 1, "correct": true, "feedback": "..." } ] }
+    Generate a quiz from document text with one concurrent call per sampled excerpt,
+    then merge the questions and renumber them 1..N. Raises if any call fails.
     """
-    if not api_key:
-        return {"score": "0/0", "results": []}
+    if num_questions < 1:
+        raise ValueError("num_questions must be at least 1")
+    chunks = chunk_document(context_text) or [""]
+    # A few questions per window, one window from each equal stretch of the text,
+    # so even a short quiz draws on the beginning, middle and end
+    windows = min(num_questions, len(chunks), MAX_DOCUMENT_WINDOWS)
+    picks = [random.randrange(i * len(chunks) // windows, (i + 1) * len(chunks) // windows) for i in range(windows)]
+    base, extra = divmod(num_questions, windows)
+    batch_sizes = [base + 1] * extra + [base] * (windows - extra)
+
+    async def run(chunk: str, count: int) -> List[Dict[str, Any]]:
+        prompt = build_document_quiz_prompt(chunk, topic, quiz_format, count, difficulty,
+                                            custom_instructions, difficulty_instruction, options_instruction)
+        async with _ai_semaphore:
+            response = await client.aio.models.generate_content(
+                model=get_gemini_model_name(),
+                contents=prompt,
+                config=json_output_config(GeneratedQuiz)
+            )
+        return parsed_response(response).get("questions", [])
 
-    client = get_gemini_client(api_key)
-    
+    results = await asyncio.gather(*(run(chunks[i], n) for i, n in zip(picks, batch_sizes)), return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+    questions = [q for batch in results for q in batch]
+    for i, q in enumerate(questions, 1):
+        q["id"] = i
+    return {"topic": topic, "format": quiz_format, "questions": questions}
+
+def build_evaluation_prompt(questions: List[Dict], answers: Dict[str, str]) -> str:
     # improved prompt for partial credit and theory evaluation
-    prompt = f"""
+    return f"""
     Evaluate this quiz submission.
     
     Questions and Model Answers (Reference):
-    {json.dumps(questions, indent=2)}
+    {_dumps(questions)}
     
     User Answers:
-    {json.dumps(answers, indent=2)}
+    {_dumps(answers)}
     
     Task:
     1. For Multiple Choice questions:
@@ -363,46 +998,110 @@ async def evaluate_submission_ai(questions: List[Dict], answers: Dict[str, str],
       ]
     }}
     """
-    
-    try:
-        response = client.models.generate_content(
+
+# Theory grading sends a compact [{id, q, model, ans}] array; long model answers are cut
+# since the grader only needs the key points, and quizzes over the limit are split up.
+MODEL_ANSWER_MAX_CHARS = 500
+THEORY_EVAL_MAX_SINGLE = 30
+THEORY_EVAL_BATCH_SIZE = 10
+
+def compact_theory_items(questions: List[Dict], answers: Dict[str, str]) -> List[Dict[str, Any]]:
+    """Minimal per-question payload for the theory grading prompt."""
+    items = []
+    for q in questions:
+        model_answer = str(q.get("correct_answer") or "")
+        if len(model_answer) > MODEL_ANSWER_MAX_CHARS:
+            model_answer = model_answer[:MODEL_ANSWER_MAX_CHARS] + "..."
+        items.append({
+            "id": q.get("id"),
+            "q": q.get("question") or q.get("text", ""),
+            "model": model_answer,
+            "ans": answers.get(str(q.get("id")), "")
+        })
+    return items
+
+async def _evaluate_batch(client, questions: List[Dict], answers: Dict[str, str]) -> List[Dict[str, Any]]:
+    prompt = build_evaluation_prompt(questions, answers)
+    # Resubmitting the same answers (retries, double clicks) reuses the earlier grading
+    cache_key = ai_response_cache_key(get_gemini_model_name(), prompt)
+    raw_text = get_cached_ai_text(cache_key)
+    if raw_text is not None:
+        return _loads(raw_text)["results"]
+    async with _ai_semaphore:
+        response = await client.aio.models.generate_content(
             model=get_gemini_model_name(),
-            contents=prompt
+            contents=prompt,
+            config=json_output_config(BatchEvaluation)
         )
-        content = response.text
-        cleaned_json = clean_json_text(content)
-        evaluation = json.loads(cleaned_json)
-        
-        # Calculate final score string and ensure "correct" mapping for UI
-        results = evaluation.get("results", [])
-        total_obtained = 0
-        for r in results:
-            if "score" in r:
-                s = float(r.get("score", 0))
-            else:
-                # Fallback to 'correct' if 'score' is missing
-                s = 1.0 if r.get("correct") else 0.0
-                r["score"] = s
-                
-            total_obtained += s
-            r["correct"] = s >= 0.5
-            
-        display_score = f"{int(total_obtained) if total_obtained.is_integer() else round(total_obtained, 2)}/{len(results)}"
-        
-        return {
-            "score": display_score,
-            "results": results
-        }
-    except Exception as e:
-        print(f"AI Evaluation Error: {e}")
+    results = parsed_response(response).get("results", [])
+    if results:
+        cache_ai_text(cache_key, _dumps({"results": results}))
+    return results
+
+async def evaluate_submission_ai(questions: List[Dict], answers: Dict[str, str], api_key: str) -> Dict[str, Any]:
+    """
+    Evaluates quiz submission using AI.
+    Questions are graded in small batches that run concurrently; if any batch fails the
+    whole evaluation is reported empty so callers fall back to local grading.
+    Returns: { "score": "X/Y", "results": [ { "id": 1, "correct": true, "feedback": "..." } ] }
+    """
+    if not api_key:
+        return {"score": "0/0", "results": []}
+
+    client = get_gemini_client(api_key)
+    
+    # Each batch only carries the answers for its own questions
+    batches = [questions[i:i + EVAL_BATCH_SIZE] for i in range(0, len(questions), EVAL_BATCH_SIZE)]
+    batch_results = await asyncio.gather(*(
+        _evaluate_batch(client, batch, {str(q["id"]): answers.get(str(q["id"]), "") for q in batch})
+        for batch in batches
+    ), return_exceptions=True)
+    
+    failures = [r for r in batch_results if isinstance(r, BaseException)]
+    if failures:
+        for e in failures:
+            print(f"AI Evaluation Error: {e}")
         # Fallback empty result
         return {"score": "0/0", "results": []}
+    
+    results = [r for batch in batch_results for r in batch]
+    
+    # Calculate final score string and ensure "correct" mapping for UI
+    total_obtained = 0.0
+    for r in results:
+        if "score" in r:
+            s = float(r.get("score", 0))
+        else:
+            # Fallback to 'correct' if 'score' is missing
+            s = 1.0 if r.get("correct") else 0.0
+            r["score"] = s
+            
+        total_obtained += s
+        r["correct"] = s >= 0.5
+        
+    display_score = f"{int(total_obtained) if total_obtained.is_integer() else round(total_obtained, 2)}/{len(results)}"
+    
+    return {
+        "score": display_score,
+        "results": results
+    }
+
+def require_google_key(user_id: str = Depends(auth.get_current_user_id), db: Session = Depends(database.get_db)) -> str:
+    """
+    Resolve the signed-in user's Google API key.
+    The user is read by primary key (identity-map hit if already loaded), and FastAPI
+    caches the dependency so each request looks the key up once.
+    """
+    user = db.get(models.User, user_id)
+    if not user or not user.google_api_key:
+        raise HTTPException(status_code=400, detail="Google API Key not set. Please go to settings.")
+    return user.google_api_key
 
 # --- Routes ---
 
 @app.post("/api/user/settings")
 def save_settings(settings: UserSettings, user_id: str = Depends(auth.get_current_user_id), db: Session = Depends(database.get_db)):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = db.get(models.User, user_id)
     if not user:
         user = models.User(id=user_id)
         db.add(user)
@@ -417,78 +1116,43 @@ def save_settings(settings: UserSettings, user_id: str = Depends(auth.get_curren
 # Removed duplicate student routes to prevent 401 loop and key mismatch
 
 @app.post("/api/generate-quiz")
-def generate_quiz(req: GenerateQuizRequest, user_id: str = Depends(auth.get_current_user_id), db: Session = Depends(database.get_db)):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user or not user.google_api_key:
-        raise HTTPException(status_code=400, detail="Google API Key not set. Please go to settings.")
+async def generate_quiz(req: GenerateQuizRequest, user_id: str = Depends(auth.get_current_user_id), google_key: str = Depends(require_google_key), db: Session = Depends(database.get_db)):
+    client = get_gemini_client(google_key)
+
+    # Prompt construction based on format and difficulty
+    options_instruction = _OPTIONS_INSTR.get(req.format, "")
+    difficulty_instruction = _TOPIC_DIFFICULTY_INSTR.get(req.difficulty.lower(), "")
+
+    prompt = _TOPIC_QUIZ_PROMPT.format_map({
+        "options_instruction": options_instruction,
+        "topic": req.topic,
+        "format": req.format,
+        "difficulty": req.difficulty,
+        "difficulty_instruction": difficulty_instruction,
+        "num_questions": req.num_questions,
+        "custom_instructions": req.custom_instructions or "None",
+    })
+    
+    cache_key = quiz_cache_key("topic", req.topic, req.format, req.num_questions, req.difficulty, req.custom_instructions)
+    async with quiz_generation_lock(cache_key):
+        quiz_json = get_cached_quiz(cache_key)
+        if quiz_json is None:
+            print(f"Generating quiz with prompt: {prompt}") # Debug
 
-    client = get_gemini_client(user.google_api_key)
-
-    # Prompt construction based on format
-    options_instruction = ""
-    if req.format == "objective":
-        options_instruction = "options MUST include A, B, C, D keys mapped to answer text."
-    elif req.format in ["theory", "fill_in_the_blank"]:
-        options_instruction = "options MUST be null."
-
-    # Difficulty Logic
-    difficulty_instruction = ""
-    if req.difficulty.lower() == "easy":
-        difficulty_instruction = "Focus on high-level definitions and key terms. Keep questions simple and direct."
-    elif req.difficulty.lower() == "medium":
-        difficulty_instruction = "Focus on core concepts, relationships, and practical applications."
-    elif req.difficulty.lower() == "hard":
-        difficulty_instruction = "Focus on critical analysis, logical inferences, and complex problem-solving. Avoid surface-level facts. Ask 'why' and 'how' questions that probe deep understanding."
-
-    prompt = f"""
-    Generate a high-fidelity assessment about "{req.topic}".
-    Format: {req.format}
-    Difficulty: {req.difficulty}
-    {difficulty_instruction}
-    Number of questions: {req.num_questions}
-    Custom Instructions: {req.custom_instructions or "None"}
-    
-    Return ONLY a raw JSON object. NO markdown.
-    The JSON format MUST be EXACTLY:
-    {{
-      "topic": "{req.topic}",
-      "format": "{req.format}",
-      "questions": [
-        {{
-          "id": 1,
-          "question": "string",
-          "options": object or null, 
-          "answer": ""
-        }}
-      ]
-    }}
-    
-    Rules:
-    - {options_instruction}
-    - answer field MUST be null (user input initially).
-    - correct_answer field MUST contain the correct answer.
-    - Randomize the position of the correct answer (A, B, C, D). Do NOT default to 'B', 'C', or 'D'.
-    - Ask and generate questions from random parts.
-    - ensure unique IDs for questions (1, 2, 3...)
-    - Focus ONLY on the SUBJECT MATTER and CONTENT.
-    - NEGATIVE CONSTRAINTS: Do NOT ask about authors, publication dates, publishers, or document metadata (e.g., 'Who is the corresponding author?', 'What is the date of publication?'). These are NOT reasonable questions. Focus on concepts, logic, and core information.
-    """
-    
-    print(f"Generating quiz with prompt: {prompt}") # Debug
-
-    try:
-        response = client.models.generate_content(
-            model=get_gemini_model_name(),
-            contents=prompt
-        )
-        text = clean_json_text(response.text)
-        quiz_json = json.loads(text)
-        
-    except Exception as e:
-        print(f"Error generating quiz: {e}")
-        if hasattr(e, 'status_code'):
-             print(f"API ERROR STATUS: {e.status_code}")
-        raise HTTPException(status_code=500, detail=f"AI Generation Failed: {str(e)}")
+            try:
+                response = await client.aio.models.generate_content(
+                    model=get_gemini_model_name(),
+                    contents=prompt,
+                    config=json_output_config(GeneratedQuiz)
+                )
+                quiz_json = parsed_response(response)
+            
+            except Exception as e:
+                print(f"Error generating quiz: {e}")
+                if hasattr(e, 'status_code'):
+                     print(f"API ERROR STATUS: {e.status_code}")
+                raise HTTPException(status_code=500, detail=f"AI Generation Failed: {str(e)}")
+            cache_quiz(cache_key, quiz_json)
 
     # Save to DB
     new_quiz = models.Quiz(
@@ -499,18 +1163,11 @@ def generate_quiz(req: GenerateQuizRequest, user_id: str = Depends(auth.get_curr
         time_limit=req.time_limit
     )
     db.add(new_quiz)
-    db.commit()
-    db.refresh(new_quiz)
+    db.flush()  # Assigns new_quiz.id; quiz and questions commit together below
+    quiz_id = new_quiz.id
 
     # Save questions (optional, but good for record)
-    for q in quiz_json.get("questions", []):
-        new_q = models.Question(
-            quiz_id=new_quiz.id,
-            text=q["question"],
-            options=q["options"],
-            correct_answer="" # Not known yet
-        )
-        db.add(new_q)
+    add_quiz_questions(db, quiz_id, quiz_json.get("questions", []))
     db.commit()
     
     # Return the AI generated JSON directly (with the quiz_id added if needed, or just let frontend handle)
@@ -523,8 +1180,8 @@ def generate_quiz(req: GenerateQuizRequest, user_id: str = Depends(auth.get_curr
     # BUT, for the DB record, I'll return what the AI gave.
     
     # Return the AI generated JSON directly, but INJECT our database ID
-    quiz_json['quiz_id'] = new_quiz.id
-    quiz_json['time_limit'] = new_quiz.time_limit
+    quiz_json['quiz_id'] = quiz_id
+    quiz_json['time_limit'] = req.time_limit
     return quiz_json
 
 from fastapi import UploadFile, File, Form
@@ -532,6 +1189,32 @@ from llama_parse import LlamaParse
 import nest_asyncio
 nest_asyncio.apply()
 
+# Caps in-flight LlamaParse jobs per process so bursts of uploads queue here instead of
+# hitting the service's rate limit
+LLAMAPARSE_MAX_CONCURRENCY = int(os.getenv("LLAMAPARSE_CONCURRENCY", "4"))
+_llamaparse_semaphore = asyncio.Semaphore(LLAMAPARSE_MAX_CONCURRENCY)
+
+async def parse_document(file_path: str) -> str:
+    """Parse a document file to markdown with LlamaParse."""
+    # Load parsing key from env
+    parsing_api_key = os.getenv("LLAMA_CLOUD_API_KEY")
+    if not parsing_api_key:
+         raise HTTPException(status_code=500, detail="LLAMA_CLOUD_API_KEY not set on server.")
+
+    print(f"DEBUG: Loaded LLAMA_CLOUD_API_KEY: {parsing_api_key[:10]}... (Length: {len(parsing_api_key)})")
+
+    parser = LlamaParse(
+        api_key=parsing_api_key,
+        result_type="markdown",
+        verbose=True
+    )
+    
+    async with _llamaparse_semaphore:
+        documents = await parser.aload_data(file_path)
+    if not documents:
+         raise HTTPException(status_code=400, detail="Could not parse document.")
+    return documents[0].text
+
 @app.post("/api/generate-quiz-from-doc")
 async def generate_quiz_from_doc(
     file: UploadFile = File(...),
@@ -542,131 +1225,69 @@ async def generate_quiz_from_doc(
     time_limit: int = Form(30),
     custom_instructions: Optional[str] = Form(None),
     user_id: str = Depends(auth.get_current_user_id),
+    google_key: str = Depends(require_google_key),
     db: Session = Depends(database.get_db)
 ):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user or not user.google_api_key:
-        raise HTTPException(status_code=400, detail="Google API Key not set.")
-
-    # Save file temporarily
-    file_path = f"temp_{file.filename}"
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
-
-    try:
-        # Load parsing key from env
-        parsing_api_key = os.getenv("LLAMA_CLOUD_API_KEY")
-        if not parsing_api_key:
-             raise HTTPException(status_code=500, detail="LLAMA_CLOUD_API_KEY not set on server.")
+    if num_questions < 1:
+        raise HTTPException(status_code=400, detail="num_questions must be at least 1")
 
-        print(f"DEBUG: Loaded LLAMA_CLOUD_API_KEY: {parsing_api_key[:10]}... (Length: {len(parsing_api_key)})")
+    # Save file temporarily, hashing it on the way to disk
+    file_path, file_hash = await asyncio.to_thread(save_upload_to_temp, file)
 
-        parser = LlamaParse(
-            api_key=parsing_api_key,
-            result_type="markdown",
-            verbose=True
-        )
-        
-        documents = await parser.aload_data(file_path)
-        if not documents:
-             raise HTTPException(status_code=400, detail="Could not parse document.")
-        
-        context_text = documents[0].text
-        # Limit context to avoid context window issues (simple truncation for now)
-        context_text = context_text[:15000] 
+    # Identical bytes parse to identical markdown, so reuse the caller's earlier parse of this
+    # file instead of sending it to LlamaParse again
+    cached_doc = db.query(models.Document).filter_by(
+        user_id=user_id, content_hash=file_hash
+    ).first()
 
-    except Exception as e:
-        print(f"Parsing error: {e}")
-        raise HTTPException(status_code=500, detail=f"Document Parsing Failed: {str(e)}")
-    finally:
-        if os.path.exists(file_path):
-            os.remove(file_path)
+    if cached_doc is not None:
+        os.remove(file_path)
+        context_text = cached_doc.content
+        print(f"Reusing parsed document {cached_doc.id} for {file.filename}")
+    else:
+        try:
+            # Keep the full text; generation works on sampled excerpts of it
+            context_text = await parse_document(file_path)
 
-    # Save to DB
-    new_doc = models.Document(
-        user_id=user_id,
-        filename=file.filename,
-        content=context_text
-    )
-    db.add(new_doc)
-    # We commit later with quiz or now? A single commit is usually better but here we have unrelated operations.
-    # Let's commit doc now so it's saved even if quiz generation fails? 
-    # Or keep it atomic? User wants "save it as markdown". 
-    db.commit() 
-    db.refresh(new_doc)
+        except Exception as e:
+            print(f"Parsing error: {e}")
+            raise HTTPException(status_code=500, detail=f"Document Parsing Failed: {str(e)}")
+        finally:
+            if os.path.exists(file_path):
+                os.remove(file_path)
 
-    # Save to DB (new_doc already saved above)
+    # Save to DB, unless the caller already has this exact document
+    if cached_doc is None:
+        new_doc = models.Document(
+            user_id=user_id,
+            filename=file.filename,
+            content=context_text,
+            content_hash=file_hash
+        )
+        db.add(new_doc)
+        # Commit the doc now so it's saved even if quiz generation fails
+        db.commit() 
 
     # Generate Quiz with context
-    client = get_gemini_client(user.google_api_key)
-
-    options_instruction = ""
-    if format == "objective":
-        options_instruction = "options MUST include A, B, C, D keys mapped to answer text."
-    elif format in ["theory", "fill_in_the_blank"]:
-        options_instruction = "options MUST be null."
-
-    # Difficulty Logic
-    difficulty_instruction = ""
-    if difficulty.lower() == "easy":
-        difficulty_instruction = "Focus on high-level definitions and key terms. Keep questions simple and direct."
-    elif difficulty.lower() == "medium":
-        difficulty_instruction = "Extract questions from the beginning, middle, and end. Focus on core concepts and relationships."
-    elif difficulty.lower() == "hard":
-        difficulty_instruction = "Focus on subtle details, logical inferences, and complex scenarios found deep in the text. Ignore obvious surface-level facts. Ask 'why' and 'how'."
+    client = get_gemini_client(google_key)
 
-    prompt = f"""
-    Generate a high-fidelity, concept-focused assessment about "{topic}" based on the following DOCUMENT CONTEXT.
-    
-    DOCUMENT CONTEXT:
-    {context_text}
-    
-    ----------------
-    
-    Task:
-    Generate {num_questions} questions.
-    Format: {format}
-    Difficulty: {difficulty}
-    Custom Instructions: {custom_instructions or "None"}
-    
-    Return ONLY a raw JSON object. NO markdown.
-    The JSON format MUST be EXACTLY:
-    {{
-      "topic": "{topic}",
-      "format": "{format}",
-      "questions": [
-        {{
-          "id": 1,
-          "question": "string",
-          "options": object or null, 
-          "answer": ""
-        }}
-      ]
-    }}
-    
-    Rules:
-    - Questions MUST be answered using the provided context.
-    - Randomize the position of the correct answer (A, B, C, D).
-    - Ask and generate questions from random parts of the document, do not ask questions from starting to ending - you can start asking questions from the middle of the pdf and also from bullet points mentioned in the document.
-    - {difficulty_instruction}
-    - ENSURE questions are distributed across the ENTIRE text provided.
-    - {options_instruction}
-    - answer field MUST always be an empty string string (user will fill it).
-    - ensure unique IDs for questions (1, 2, 3...)
-    - NEGATIVE CONSTRAINTS: Do NOT ask about authors, publication dates, publishers, journals, or document structure (e.g., 'Who is the corresponding author?', 'Date of current version', 'what is after chapter 1'). These are NOT reasonable questions for understanding. Focus ONLY on the SUBJECT MATTER and CONTENT of the document.
-    """
-    
-    try:
-        response = client.models.generate_content(
-            model=get_gemini_model_name(),
-            contents=prompt
-        )
-        text = clean_json_text(response.text)
-        quiz_json = json.loads(text)
-        
-    except Exception as e:
-        print(f"Error generating quiz from doc: {e}")
-        raise HTTPException(status_code=500, detail=f"AI Generation Failed: {str(e)}")
+    options_instruction = _OPTIONS_INSTR.get(format, "")
+    difficulty_instruction = _DOCUMENT_DIFFICULTY_INSTR.get(difficulty.lower(), "")
+
+    cache_key = quiz_cache_key("document", content_hash(context_text), topic, format, num_questions, difficulty, custom_instructions)
+    async with quiz_generation_lock(cache_key):
+        quiz_json = get_cached_quiz(cache_key)
+        if quiz_json is None:
+            try:
+                quiz_json = await generate_document_quiz(
+                    client, context_text, topic, format, num_questions, difficulty,
+                    custom_instructions, difficulty_instruction, options_instruction
+                )
+            
+            except Exception as e:
+                print(f"Error generating quiz from doc: {e}")
+                raise HTTPException(status_code=500, detail=f"AI Generation Failed: {str(e)}")
+            cache_quiz(cache_key, quiz_json)
 
     # Save to DB
     new_quiz = models.Quiz(
@@ -676,20 +1297,13 @@ async def generate_quiz_from_doc(
         time_limit=time_limit
     )
     db.add(new_quiz)
-    db.commit()
-    db.refresh(new_quiz)
-
-    for q in quiz_json.get("questions", []):
-        new_q = models.Question(
-            quiz_id=new_quiz.id,
-            text=q["question"],
-            options=q["options"],
-            correct_answer=""
-        )
-        db.add(new_q)
+    db.flush()  # Assigns new_quiz.id; quiz and questions commit together below
+    quiz_id = new_quiz.id
+
+    add_quiz_questions(db, quiz_id, quiz_json.get("questions", []))
     db.commit()
     
-    quiz_json['quiz_id'] = new_quiz.id
+    quiz_json['quiz_id'] = quiz_id
     return quiz_json
 
 @app.get("/api/documents", response_model=List[DocumentResponse])
@@ -698,10 +1312,9 @@ def get_documents(user_id: str = Depends(auth.get_current_user_id), db: Session
     return docs
 
 @app.post("/api/generate-quiz-from-existing-doc")
-def generate_quiz_from_existing_doc(req: GenerateQuizFromExistingRequest, user_id: str = Depends(auth.get_current_user_id), db: Session = Depends(database.get_db)):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user or not user.google_api_key:
-        raise HTTPException(status_code=400, detail="Google API Key not set.")
+async def generate_quiz_from_existing_doc(req: GenerateQuizFromExistingRequest, user_id: str = Depends(auth.get_current_user_id), google_key: str = Depends(require_google_key), db: Session = Depends(database.get_db)):
+    if req.num_questions < 1:
+        raise HTTPException(status_code=400, detail="num_questions must be at least 1")
 
     # Fetch document
     doc = db.query(models.Document).filter(models.Document.id == req.document_id, models.Document.user_id == user_id).first()
@@ -710,75 +1323,25 @@ def generate_quiz_from_existing_doc(req: GenerateQuizFromExistingRequest, user_i
 
     context_text = doc.content # Already parsed markdown
 
-    client = get_gemini_client(user.google_api_key)
-
-    options_instruction = ""
-    if req.format == "objective":
-        options_instruction = "options MUST include A, B, C, D keys mapped to answer text."
-    elif req.format in ["theory", "fill_in_the_blank"]:
-        options_instruction = "options MUST be null."
+    client = get_gemini_client(google_key)
 
-    # Difficulty Logic
-    difficulty_instruction = ""
-    if req.difficulty.lower() == "easy":
-        difficulty_instruction = "Focus on high-level definitions and key terms. Keep questions simple and direct."
-    elif req.difficulty.lower() == "medium":
-        difficulty_instruction = "Extract questions from the beginning, middle, and end. Focus on core concepts and relationships."
-    elif req.difficulty.lower() == "hard":
-        difficulty_instruction = "Focus on subtle details, logical inferences, and complex scenarios found deep in the text. Ignore obvious surface-level facts. Ask 'why' and 'how'."
+    options_instruction = _OPTIONS_INSTR.get(req.format, "")
+    difficulty_instruction = _DOCUMENT_DIFFICULTY_INSTR.get(req.difficulty.lower(), "")
 
-    prompt = f"""
-    Generate a high-fidelity, concept-focused assessment about "{req.topic}" based on the following DOCUMENT CONTEXT.
-    
-    DOCUMENT CONTEXT:
-    {context_text}
-    
-    ----------------
-    
-    Task:
-    Generate {req.num_questions} questions.
-    Format: {req.format}
-    Difficulty: {req.difficulty}
-    Custom Instructions: {req.custom_instructions or "None"}
-    
-    Return ONLY a raw JSON object. NO markdown.
-    The JSON format MUST be EXACTLY:
-    {{
-      "topic": "{req.topic}",
-      "format": "{req.format}",
-      "questions": [
-        {{
-          "id": 1,
-          "question": "string",
-          "options": object or null, 
-          "answer": ""
-        }}
-      ]
-    }}
-    
-    Rules:
-    - Questions MUST be answered using the provided context.
-    - Randomize the position of the correct answer (A, B, C, D). Do NOT default to 'B', 'C', or 'D'. Randomize the position of the correct answer (A, B, C, D).
-    - Generate questions from random parts, do not start from the beginning or end of the text (that is you can from the middle, from chapter 2 or even from random parts).
-    - {difficulty_instruction}
-    - ENSURE questions are distributed across the ENTIRE text provided.
-    - {options_instruction}
-    - answer field MUST always be an empty string string (user will fill it).
-    - ensure unique IDs for questions (1, 2, 3...)
-    - NEGATIVE CONSTRAINTS: Do NOT ask about authors, publication dates, publishers, journals, or document structure (e.g., 'corresponding author', 'Date of publication', 'matriculation number'). Focus ONLY on the SUBJECT MATTER and CONTENT of the document.
-    """
-    
-    try:
-        response = client.models.generate_content(
-            model=get_gemini_model_name(),
-            contents=prompt
-        )
-        text = clean_json_text(response.text)
-        quiz_json = json.loads(text)
-        
-    except Exception as e:
-        print(f"Error generating quiz from existing doc: {e}")
-        raise HTTPException(status_code=500, detail=f"AI Generation Failed: {str(e)}")
+    cache_key = quiz_cache_key("document", content_hash(context_text), req.topic, req.format, req.num_questions, req.difficulty, req.custom_instructions)
+    async with quiz_generation_lock(cache_key):
+        quiz_json = get_cached_quiz(cache_key)
+        if quiz_json is None:
+            try:
+                quiz_json = await generate_document_quiz(
+                    client, context_text, req.topic, req.format, req.num_questions, req.difficulty,
+                    req.custom_instructions, difficulty_instruction, options_instruction
+                )
+            
+            except Exception as e:
+                print(f"Error generating quiz from existing doc: {e}")
+                raise HTTPException(status_code=500, detail=f"AI Generation Failed: {str(e)}")
+            cache_quiz(cache_key, quiz_json)
 
     # Save to DB
     new_quiz = models.Quiz(
@@ -789,33 +1352,23 @@ def generate_quiz_from_existing_doc(req: GenerateQuizFromExistingRequest, user_i
         time_limit=req.time_limit
     )
     db.add(new_quiz)
-    db.commit()
-    db.refresh(new_quiz)
-
-    for q in quiz_json.get("questions", []):
-        new_q = models.Question(
-            quiz_id=new_quiz.id,
-            text=q["question"],
-            options=q["options"],
-            correct_answer=""
-        )
-        db.add(new_q)
+    db.flush()  # Assigns new_quiz.id; quiz and questions commit together below
+    quiz_id = new_quiz.id
+
+    add_quiz_questions(db, quiz_id, quiz_json.get("questions", []))
     db.commit()
     
-    quiz_json['quiz_id'] = new_quiz.id
+    quiz_json['quiz_id'] = quiz_id
     return quiz_json
 
 @app.post("/api/submit-quiz")
-def submit_quiz(submission: Dict[str, Any], user_id: str = Depends(auth.get_current_user_id), db: Session = Depends(database.get_db)):
+async def submit_quiz(submission: Dict[str, Any], user_id: str = Depends(auth.get_current_user_id), google_key: str = Depends(require_google_key), db: Session = Depends(database.get_db)):
     # submisison is the FULL quiz JSON with "answer" filled in.
     
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user or not user.google_api_key:
-        raise HTTPException(status_code=400, detail="API Key missing")
-
-    client = get_gemini_client(user.google_api_key)
+    client = get_gemini_client(google_key)
 
-    submission_str = json.dumps(submission, indent=2)
+    # Compact JSON: indentation only adds billed prompt tokens
+    submission_str = _dumps(submission)
 
     prompt = f"""
     Evaluate this quiz submission.
@@ -841,17 +1394,16 @@ def submit_quiz(submission: Dict[str, Any], user_id: str = Depends(auth.get_curr
     """
 
     try:
-        response = client.models.generate_content(
+        # Constrain the output to the EvaluationResponse schema so the reply is plain JSON
+        response = await client.aio.models.generate_content(
             model=get_gemini_model_name(),
-            contents=prompt
+            contents=prompt,
+            config=json_output_config(EvaluationResponse, temperature=0.2)
         )
         raw_text = response.text
         print(f"DEBUG - Raw AI Response: {raw_text}") 
         
-        text = clean_json_text(raw_text)
-        print(f"DEBUG - Cleaned JSON Text: {text}") 
-        
-        evaluation = json.loads(text)
+        evaluation = parsed_response(response)
         
     except Exception as e:
         print(f"Error evaluating quiz: {e}")
@@ -861,68 +1413,60 @@ def submit_quiz(submission: Dict[str, Any], user_id: str = Depends(auth.get_curr
     # Extract quiz_id if present to link correctly
     quiz_id = submission.get('quiz_id')
     
+    score = evaluation.get("score", "0/0")
     attempt = models.Attempt(
         user_id=user_id,
-        score=evaluation.get("score", "0/0"),
+        score=score,
+        score_percentage=score_percentage_value(score),
         feedback=evaluation.get("results"),
         quiz_id=quiz_id 
     )
     db.add(attempt)
+    # Flush for the ID; after commit the instance is expired and reading it would re-SELECT
+    db.flush()
+    attempt_id = attempt.id
     db.commit()
-    db.refresh(attempt) # Refresh to get ID
 
     return {
-        "attempt_id": attempt.id,
+        "attempt_id": attempt_id,
         **evaluation
     }
 
-@app.get("/api/history")
+@app.get("/api/history", response_model=List[AttemptHistoryItem])
 def get_history(user_id: str = Depends(auth.get_current_user_id), db: Session = Depends(database.get_db)):
-    attempts = db.query(models.Attempt).filter(models.Attempt.user_id == user_id).order_by(models.Attempt.timestamp.desc()).all()
-    return [
-        {
-            "id": a.id,
-            "quiz_topic": a.quiz.topic if a.quiz else "Unknown Topic", # Handle missing quiz relation safely
-            "score": a.score,
-            "timestamp": a.timestamp,
-        }
-        for a in attempts
-    ]
+    # Only the four response columns, with the topic joined in (no ORM objects, no per-row quiz load)
+    return db.query(
+        models.Attempt.id,
+        func.coalesce(models.Quiz.topic, "Unknown Topic").label("quiz_topic"), # Handle missing quiz relation safely
+        models.Attempt.score,
+        models.Attempt.timestamp,
+    ).outerjoin(models.Quiz, models.Attempt.quiz_id == models.Quiz.id).filter(
+        models.Attempt.user_id == user_id
+    ).order_by(models.Attempt.timestamp.desc()).all()
 
 @app.get("/api/history/{attempt_id}")
 def get_attempt_details(attempt_id: int, user_id: str = Depends(auth.get_current_user_id), db: Session = Depends(database.get_db)):
-    attempt = db.query(models.Attempt).filter(models.Attempt.id == attempt_id, models.Attempt.user_id == user_id).first()
+    attempt = db.query(models.Attempt).options(joinedload(models.Attempt.quiz)).filter(models.Attempt.id == attempt_id, models.Attempt.user_id == user_id).first()
     if not attempt:
         raise HTTPException(status_code=404, detail="Attempt not found")
     
-    # Fetch questions for this quiz to get the original text
-    questions = []
+    # Fetch the question texts for this quiz; feedback IDs are 1-based positions
+    # (the AI numbers them 1, 2, 3...)
+    texts = []
     if attempt.quiz_id:
-        questions = db.query(models.Question).filter(models.Question.quiz_id == attempt.quiz_id).order_by(models.Question.id.asc()).all()
-    
-    # Map index+1 to question text (assuming AI used IDs 1, 2, 3...)
-    q_map = {i+1: q.text for i, q in enumerate(questions)}
+        texts = db.execute(
+            select(models.Question.text).where(models.Question.quiz_id == attempt.quiz_id).order_by(models.Question.id.asc())
+        ).scalars().all()
     
     enhanced_feedback = []
     if attempt.feedback:
         for item in attempt.feedback:
-            # item is dict {id, correct, feedback}
-            # We clone it to avoid mutating the ORM object in place (though it's JSON)
-            new_item = item.copy()
-            qid = new_item.get('id')
-            
-            # Try to map by ID (1-based index)
-            if isinstance(qid, int) and qid in q_map:
-                new_item['question_text'] = q_map[qid]
-            # Fallback: if we have questions but ID doesn't match, maybe try array index matching if IDs are weird?
-            # But let's trust strict ID matching 1..N first for simplicity. 
-            elif questions and isinstance(qid, int) and 0 <= qid - 1 < len(questions):
-                 # ID might be 1-based index but q_map failed? Re-try simple index access
-                 new_item['question_text'] = questions[qid-1].text
-            else:
-                 new_item['question_text'] = "Question text unavailable"
-            
-            enhanced_feedback.append(new_item)
+            # item is dict {id, correct, feedback}; copied so the stored JSON isn't mutated
+            qid = item.get('id')
+            enhanced_feedback.append({
+                **item,
+                'question_text': texts[qid - 1] if isinstance(qid, int) and 1 <= qid <= len(texts) else "Question text unavailable"
+            })
 
     return {
         "id": attempt.id,
@@ -950,7 +1494,7 @@ def register_school(req: SchoolRegisterRequest, db: Session = Depends(database.g
     password_hash = school_auth.hash_password(req.password)
     
     # Get education system for country
-    education_system = EDUCATION_SYSTEMS[req.country]["levels"]
+    education_system = list(EDUCATION_SYSTEMS[req.country])
     
     # Create school
     new_school = models.School(
@@ -961,39 +1505,60 @@ def register_school(req: SchoolRegisterRequest, db: Session = Depends(database.g
         education_system=education_system
     )
     db.add(new_school)
+    # Flush to get the ID now; after commit the instance is expired and reading it would re-SELECT
+    db.flush()
+    school_id = new_school.id
     db.commit()
-    db.refresh(new_school)
     
     # Generate token
     token = school_auth.create_access_token(
-        data={"sub": str(new_school.id)},
+        data={"sub": str(school_id)},
         token_type="school"
     )
     
     return {
         "message": "School registered successfully",
-        "school_id": new_school.id,
+        "school_id": school_id,
         "token": token,
         "school": {
-            "id": new_school.id,
-            "name": new_school.name,
-            "email": new_school.email,
-            "country": new_school.country,
-            "education_system": new_school.education_system
+            "id": school_id,
+            "name": req.name,
+            "email": req.email,
+            "country": req.country,
+            "education_system": education_system
         }
     }
 
 @app.post("/api/school/login")
-def login_school(req: SchoolLoginRequest, db: Session = Depends(database.get_db)):
+async def login_school(req: SchoolLoginRequest, db: AsyncSession = Depends(database.get_async_db)):
     """School login."""
-    school = db.query(models.School).filter(models.School.email == req.email).first()
+    school = (await db.execute(
+        select(models.School).where(models.School.email == req.email)
+    )).scalars().first()
+    
+    # Hand the pooled connection back before the slow hash check (loaded attributes stay readable)
+    await db.close()
+    
+    # The hash is checked even for unknown emails so both failures take as long
+    password_ok = await run_password_check(
+        school_auth.verify_password, req.password,
+        school.password_hash if school else school_auth.DUMMY_PASSWORD_HASH
+    )
     
     if not school:
         raise HTTPException(status_code=401, detail="Invalid credentials - school not found")
     
-    if not school_auth.verify_password(req.password, school.password_hash):
+    if not password_ok:
         raise HTTPException(status_code=401, detail="Invalid credentials - password mismatch")
     
+    # Upgrade legacy bcrypt hashes now that the plain password is known
+    if school_auth.needs_rehash(school.password_hash):
+        new_hash = await run_password_check(school_auth.hash_password, req.password)
+        await db.execute(
+            update(models.School).where(models.School.id == school.id).values(password_hash=new_hash)
+        )
+        await db.commit()
+    
     # Create JWT token
     access_token = school_auth.create_access_token(
         data={"sub": str(school.id)},
@@ -1014,7 +1579,8 @@ def login_school(req: SchoolLoginRequest, db: Session = Depends(database.get_db)
 @app.get("/api/school/list")
 def list_schools(db: Session = Depends(database.get_db)):
     """List all registered schools for demo/pre-login selection."""
-    schools = db.query(models.School).all()
+    # Plain rows of the three listed columns; no School instances are built
+    schools = db.query(models.School.id, models.School.name, models.School.email).all()
     return [
         {
             "id": s.id,
@@ -1091,19 +1657,37 @@ def register_individual(req: IndividualRegisterRequest, db: Session = Depends(da
     )
     
     db.add(new_individual)
+    db.flush()
+    individual_id = new_individual.id
     db.commit()
-    db.refresh(new_individual)
     
-    return {"message": "Individual registered successfully", "id": new_individual.id}
+    return {"message": "Individual registered successfully", "id": individual_id}
 
 @app.post("/api/individual/login")
-def login_individual(req: IndividualAuthRequest, db: Session = Depends(database.get_db)):
+async def login_individual(req: IndividualAuthRequest, db: AsyncSession = Depends(database.get_async_db)):
     """Login for individual users."""
-    individual = db.query(models.Individual).filter(models.Individual.email == req.email).first()
+    individual = (await db.execute(
+        select(models.Individual).where(models.Individual.email == req.email)
+    )).scalars().first()
+    
+    # Hand the pooled connection back before the slow hash check (loaded attributes stay readable)
+    await db.close()
     
-    if not individual or not individual_auth.verify_password(req.password, individual.password_hash):
+    password_ok = await run_password_check(
+        individual_auth.verify_password, req.password,
+        individual.password_hash if individual else individual_auth.DUMMY_PASSWORD_HASH
+    )
+    if not individual or not password_ok:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    # Upgrade legacy bcrypt hashes now that the plain password is known
+    if individual_auth.needs_rehash(individual.password_hash):
+        new_hash = await run_password_check(individual_auth.hash_password, req.password)
+        await db.execute(
+            update(models.Individual).where(models.Individual.id == individual.id).values(password_hash=new_hash)
+        )
+        await db.commit()
+    
     access_token = individual_auth.create_individual_access_token(data={"sub": str(individual.id)})
     
     return {
@@ -1132,43 +1716,70 @@ def get_school_profile(school_id: int = Depends(school_auth.get_current_school_i
         "created_at": school.created_at
     }
 
+# The education systems table is static, so its response body is serialized once at import
+_EDUCATION_SYSTEMS_JSON = orjson.dumps({
+    "countries": get_available_countries(),
+    "systems": get_education_systems_payload()
+})
+
 @app.get("/api/school/education-systems")
 def get_education_systems():
     """Get all available countries and their education systems."""
-    return {
-        "countries": get_available_countries(),
-        "systems": EDUCATION_SYSTEMS
-    }
+    return Response(content=_EDUCATION_SYSTEMS_JSON, media_type="application/json")
+
+# Serialized dashboard overview per school as (body, etag). Entries expire quickly and are
+# dropped by the endpoints that change a school's counts.
+_dashboard_cache = TTLCache(maxsize=1024, ttl=30)
+_dashboard_cache_lock = threading.Lock()
+
+def invalidate_school_dashboard(school_id: int) -> None:
+    with _dashboard_cache_lock:
+        _dashboard_cache.pop(school_id, None)
 
 @app.get("/api/school/dashboard/overview")
 def get_school_dashboard_overview(
+    request: Request,
     school_id: int = Depends(school_auth.get_current_school_id),
     db: Session = Depends(database.get_db)
 ):
     """Get school dashboard overview statistics with completion rate."""
-    # Get total classrooms
-    total_classrooms = db.query(models.Classroom).filter(
-        models.Classroom.school_id == school_id
-    ).count()
-    
-    # Get total students
-    total_students = db.query(models.Student).filter(
-        models.Student.school_id == school_id
-    ).count()
-    
-    # Get total quizzes
-    total_quizzes = db.query(models.SchoolQuiz).filter(
-        models.SchoolQuiz.school_id == school_id
-    ).count()
+    with _dashboard_cache_lock:
+        cached = _dashboard_cache.get(school_id)
+    if cached is None:
+        body = orjson.dumps(compute_school_dashboard_overview(school_id, db))
+        cached = (body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+        with _dashboard_cache_lock:
+            _dashboard_cache[school_id] = cached
+    
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def compute_school_dashboard_overview(school_id: int, db: Session) -> Dict[str, Any]:
+    """Classroom, student and quiz counts plus the completion rate for a school."""
+    # All four counts in one round-trip
+    total_classrooms, total_students, total_quizzes, total_actual_attempts = db.query(
+        select(func.count(models.Classroom.id)).where(
+            models.Classroom.school_id == school_id
+        ).scalar_subquery(),
+        select(func.count(models.Student.id)).where(
+            models.Student.school_id == school_id
+        ).scalar_subquery(),
+        select(func.count(models.SchoolQuiz.id)).where(
+            models.SchoolQuiz.school_id == school_id
+        ).scalar_subquery(),
+        select(func.count(models.StudentAttempt.id)).join(
+            models.Student
+        ).where(
+            models.Student.school_id == school_id,
+            models.StudentAttempt.score.isnot(None)
+        ).scalar_subquery()
+    ).one()
     
     # Calculate completion rate
     total_possible_attempts = total_students * total_quizzes
-    total_actual_attempts = db.query(models.StudentAttempt).join(
-        models.Student
-    ).filter(
-        models.Student.school_id == school_id,
-        models.StudentAttempt.score.isnot(None)
-    ).count()
     
     completion_rate = 0
     if total_possible_attempts > 0:
@@ -1198,17 +1809,20 @@ def create_classroom(
         grade_level=req.grade_level
     )
     db.add(new_classroom)
+    # The flush fills in the ID and created_at default, so the response needs no reload
+    db.flush()
+    classroom = {
+        "id": new_classroom.id,
+        "name": new_classroom.name,
+        "grade_level": new_classroom.grade_level,
+        "created_at": new_classroom.created_at
+    }
     db.commit()
-    db.refresh(new_classroom)
+    invalidate_school_dashboard(school_id)
     
     return {
         "message": "Classroom created successfully",
-        "classroom": {
-            "id": new_classroom.id,
-            "name": new_classroom.name,
-            "grade_level": new_classroom.grade_level,
-            "created_at": new_classroom.created_at
-        }
+        "classroom": classroom
     }
 
 @app.get("/api/school/classrooms")
@@ -1217,7 +1831,16 @@ def get_classrooms(
     db: Session = Depends(database.get_db)
 ):
     """Get all classrooms for the school."""
-    classrooms = db.query(models.Classroom).filter(
+    # Per-classroom counts come back as columns instead of loading each collection
+    classrooms = db.query(
+        models.Classroom,
+        select(func.count(models.Student.id)).where(
+            models.Student.classroom_id == models.Classroom.id
+        ).scalar_subquery(),
+        select(func.count(models.SchoolQuiz.id)).where(
+            models.SchoolQuiz.classroom_id == models.Classroom.id
+        ).scalar_subquery()
+    ).filter(
         models.Classroom.school_id == school_id
     ).order_by(models.Classroom.created_at.desc()).all()
     
@@ -1226,11 +1849,11 @@ def get_classrooms(
             "id": c.id,
             "name": c.name,
             "grade_level": c.grade_level,
-            "student_count": len(c.students),
-            "active_quizzes": len(c.school_quizzes),
+            "student_count": student_count,
+            "active_quizzes": quiz_count,
             "created_at": c.created_at
         }
-        for c in classrooms
+        for c, student_count, quiz_count in classrooms
     ]
 
 @app.get("/api/school/classrooms/{classroom_id}")
@@ -1240,7 +1863,11 @@ def get_classroom_details(
     db: Session = Depends(database.get_db)
 ):
     """Get detailed classroom information."""
-    classroom = db.query(models.Classroom).filter(
+    # Students (with their attempts) and quizzes are loaded up front (one SELECT per collection)
+    classroom = db.query(models.Classroom).options(
+        selectinload(models.Classroom.students).selectinload(models.Student.student_attempts),
+        selectinload(models.Classroom.school_quizzes)
+    ).filter(
         models.Classroom.id == classroom_id,
         models.Classroom.school_id == school_id
     ).first()
@@ -1248,36 +1875,46 @@ def get_classroom_details(
     if not classroom:
         raise HTTPException(status_code=404, detail="Classroom not found")
     
-    students_data = [
-        {
+    # Attempts per quiz, counted in the database rather than loading every attempt row
+    quiz_attempt_counts = dict(db.query(
+        models.StudentAttempt.school_quiz_id, func.count(models.StudentAttempt.id)
+    ).join(models.SchoolQuiz).filter(
+        models.SchoolQuiz.classroom_id == classroom_id
+    ).group_by(models.StudentAttempt.school_quiz_id).all())
+    
+    # One pass over the students builds their rows and the classroom totals
+    students_data = []
+    total_actual_submissions = 0
+    score_sum = 0.0
+    score_count = 0
+    for s in classroom.students:
+        attempts = s.student_attempts
+        percentages = [p for p in (score_to_percentage(a.score) for a in attempts if a.score) if p is not None]
+        total_actual_submissions += len(attempts)
+        score_sum += sum(percentages)
+        score_count += len(percentages)
+        students_data.append({
             "id": s.id,
             "name": s.name,
             "email": s.email,
             "student_id": s.student_id,
             "password": s.password,
             "created_at": s.created_at,
-            "attempts_count": len(s.student_attempts),
-            "average_score": calculate_student_average(s.student_attempts),
-            "quiz_scores": {str(a.school_quiz_id): a.score for a in s.student_attempts if a.score}
-        }
-        for s in classroom.students
-    ]
+            "attempts_count": len(attempts),
+            "average_score": round(sum(percentages) / len(percentages), 1) if percentages else 0,
+            "quiz_scores": {str(a.school_quiz_id): a.score for a in attempts if a.score}
+        })
 
     # Calculate aggregate stats for classroom
-    all_attempts = []
-    for s in classroom.students:
-        all_attempts.extend(s.student_attempts)
-    
-    avg_score = calculate_student_average(all_attempts)
+    avg_score = round(score_sum / score_count, 1) if score_count else 0
     total_quizzes = len(classroom.school_quizzes)
-    total_students = len(classroom.students)
-    total_actual_submissions = len(all_attempts)
+    total_students = len(students_data)
     total_possible_submissions = total_quizzes * total_students
     
     completion_percentage = (total_actual_submissions / total_possible_submissions * 100) if total_possible_submissions > 0 else 0
     submission_ratio = f"{total_actual_submissions}/{total_possible_submissions}"
 
-    return {
+    return ORJSONResponse({
         "id": classroom.id,
         "name": classroom.name,
         "grade_level": classroom.grade_level,
@@ -1296,31 +1933,62 @@ def get_classroom_details(
                 "num_questions": q.num_questions,
                 "difficulty": q.difficulty,
                 "created_at": q.created_at,
-                "attempts_count": len(q.student_attempts)
+                "attempts_count": quiz_attempt_counts.get(q.id, 0)
             }
             for q in classroom.school_quizzes
         ]
-    }
+    })
+
+@lru_cache(maxsize=4096)
+def score_to_percentage(score: str) -> Optional[float]:
+    """Percentage for an "X/Y" score string, or None if it can't be parsed.
+    Scores repeat heavily ("3/5", "7/10"...), so each distinct string is parsed once."""
+    num, sep, den = score.partition('/')
+    if not sep:
+        return None
+    try:
+        num, den = float(num), float(den)
+    except ValueError:
+        return None
+    return (num / den) * 100 if den > 0 else None
+
+async def run_concurrent_reads(*statements) -> List[List[Any]]:
+    """Execute independent SELECTs concurrently, each on its own async session, returning their rows.
+    (One AsyncSession runs statements one at a time.)"""
+    async def run(statement):
+        async with database.AsyncSessionLocal() as session:
+            return (await session.execute(statement)).all()
+    return await asyncio.gather(*(run(st) for st in statements))
+
+def score_percentage_value(score: Optional[str]) -> Optional[float]:
+    """Value stored in the score_percentage columns: the score's percentage to one decimal."""
+    pct = score_to_percentage(score) if score else None
+    return round(pct, 1) if pct is not None else None
+
+def percentage_label(score_percentage: Optional[float], score: Optional[str]) -> str:
+    """"66.7%" label; rows stored before score_percentage existed fall back to parsing the score."""
+    if score_percentage is None:
+        score_percentage = score_percentage_value(score) or 0.0
+    return f"{score_percentage}%"
+
+def display_date(value: Optional[datetime.datetime]) -> str:
+    """"Jan 05, 2025" label used by the individual portal listings."""
+    return value.strftime("%b %d, %Y") if value else "Unknown"
 
 def calculate_student_average(attempts):
-    if not attempts:
-        return 0
-    total = 0
-    count = 0
-    for a in attempts:
-        try:
-            # score format "X/Y"
-            if not a.score: continue
-            parts = a.score.split('/')
-            if len(parts) == 2:
-                num = float(parts[0])
-                den = float(parts[1])
-                if den > 0:
-                    total += (num / den) * 100
-                    count += 1
-        except Exception:
-            continue
-    return round(total / count, 1) if count > 0 else 0
+    percentages = [p for p in (score_to_percentage(a.score) for a in attempts if a.score) if p is not None]
+    return round(sum(percentages) / len(percentages), 1) if percentages else 0
+
+def average_score_counts(score_counts) -> float:
+    """calculate_student_average over (score, count) pairs from a GROUP BY score query."""
+    total = 0.0
+    n = 0
+    for score, count in score_counts:
+        pct = score_to_percentage(score) if score else None
+        if pct is not None:
+            total += pct * count
+            n += count
+    return round(total / n, 1) if n else 0
 
 @app.get("/api/school/attempts/{attempt_id}")
 def get_attempt_details(
@@ -1329,8 +1997,12 @@ def get_attempt_details(
     db: Session = Depends(database.get_db)
 ):
     """Get detailed attempt info including script."""
+    # The student row comes from the ownership join itself; the quiz is joined in too
     attempt = db.query(models.StudentAttempt).join(
         models.Student
+    ).options(
+        contains_eager(models.StudentAttempt.student),
+        joinedload(models.StudentAttempt.school_quiz)
     ).join(
         models.Classroom
     ).filter(
@@ -1367,19 +2039,30 @@ def get_student_attempts_school(
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
 
-    attempts = db.query(models.StudentAttempt).filter(
+    # The list only shows scores, so the JSON questions/answers/feedback columns stay unloaded
+    attempts = db.query(models.StudentAttempt).options(
+        load_only(
+            models.StudentAttempt.school_quiz_id,
+            models.StudentAttempt.score,
+            models.StudentAttempt.completed_at
+        ),
+        joinedload(models.StudentAttempt.school_quiz).load_only(
+            models.SchoolQuiz.topic, models.SchoolQuiz.quiz_format, models.SchoolQuiz.num_questions
+        )
+    ).filter(
         models.StudentAttempt.student_id == student_id
     ).order_by(models.StudentAttempt.completed_at.desc()).all()
 
-    # Fetch all quizzes for the student's classroom
+    # Classroom quizzes the student hasn't attempted yet (anti-join in the database)
+    attempted = select(models.StudentAttempt.id).where(
+        models.StudentAttempt.school_quiz_id == models.SchoolQuiz.id,
+        models.StudentAttempt.student_id == student_id
+    ).exists()
     classroom_quizzes = db.query(models.SchoolQuiz).filter(
-        models.SchoolQuiz.classroom_id == student.classroom_id
+        models.SchoolQuiz.classroom_id == student.classroom_id,
+        ~attempted
     ).all()
 
-    # Identify attempted quiz IDs
-    attempted_quiz_ids = {a.school_quiz_id for a in attempts}
-
-    # Quizzes not yet attempted
     undone_quizzes = [
         {
             "id": q.id,
@@ -1388,7 +2071,7 @@ def get_student_attempts_school(
             "num_questions": q.num_questions,
             "created_at": q.created_at
         }
-        for q in classroom_quizzes if q.id not in attempted_quiz_ids
+        for q in classroom_quizzes
     ]
 
     return {
@@ -1432,6 +2115,8 @@ def delete_classroom(
     
     db.delete(classroom)
     db.commit()
+    invalidate_school_dashboard(school_id)
+    invalidate_classroom_quizzes(classroom_id)
     
     return {"message": "Classroom deleted successfully"}
 
@@ -1458,52 +2143,55 @@ def bulk_import_students(
     current_year = datetime.datetime.now().year
     prefix = f"STU-{current_year}-{school_id:03d}-"
     
-    # Query all student IDs matching this year and school
-    existing_students = db.query(models.Student.student_id).filter(
+    # The database returns the highest numeric suffix after the prefix (0 if none yet),
+    # so the existing IDs never have to be fetched and parsed here. Non-numeric suffixes are
+    # filtered out first: PostgreSQL rejects them in the CAST (SQLite would read them as 0).
+    suffix = func.substr(models.Student.student_id, len(prefix) + 1)
+    max_suffix = db.query(
+        func.coalesce(func.max(cast(suffix, Integer)), 0)
+    ).filter(
         models.Student.school_id == school_id,
-        models.Student.student_id.like(f"{prefix}%")
-    ).all()
-    
-    # Extract the numeric suffixes and find the maximum
-    max_suffix = 0
-    for (student_id,) in existing_students:
-        try:
-            # Extract the last part after the final dash
-            suffix = int(student_id.split('-')[-1])
-            max_suffix = max(max_suffix, suffix)
-        except (ValueError, IndexError):
-            continue
+        models.Student.student_id.like(f"{prefix}%"),
+        suffix.regexp_match("^[0-9]+$")
+    ).scalar()
     
-    created_students = []
+    passwords = [generate_simple_password(8) for _ in req.students]  # Simpler password for students
+    # Hashing dominates import time, so all hashes are computed in parallel up front
+    password_hashes = school_auth.hash_passwords(passwords)
+    rows = []
     
     for idx, student_data in enumerate(req.students):
         # Generate credentials using incremental suffix from max
         student_count = max_suffix + idx + 1
-        unique_student_id = generate_student_id(school_id, student_count)
-        password = generate_simple_password(8)  # Simpler password for students
-        password_hash = school_auth.hash_password(password)
-        
-        # Create student
-        new_student = models.Student(
-            school_id=school_id,
-            classroom_id=classroom_id,
-            name=student_data["name"],
-            email=student_data["email"],
-            student_id=unique_student_id,
-            password_hash=password_hash,
-            password=password
-        )
-        db.add(new_student)
         
-        created_students.append({
-            "id": new_student.id,
-            "name": new_student.name,
-            "email": new_student.email,
-            "student_id": unique_student_id,
-            "password": password  # Return plain password for distribution
+        rows.append({
+            "school_id": school_id,
+            "classroom_id": classroom_id,
+            "name": student_data["name"],
+            "email": student_data["email"],
+            "student_id": generate_student_id(school_id, student_count, current_year),
+            "password_hash": password_hashes[idx],
+            "password": passwords[idx]
         })
     
+    # One multi-row INSERT; RETURNING hands back the new IDs in input order
+    new_ids = db.execute(
+        insert(models.Student).returning(models.Student.id, sort_by_parameter_order=True),
+        rows
+    ).scalars().all() if rows else []
     db.commit()
+    invalidate_school_dashboard(school_id)
+    
+    created_students = [
+        {
+            "id": new_id,
+            "name": row["name"],
+            "email": row["email"],
+            "student_id": row["student_id"],
+            "password": row["password"]  # Return plain password for distribution
+        }
+        for new_id, row in zip(new_ids, rows)
+    ]
     
     return {
         "message": f"{len(created_students)} students created successfully",
@@ -1516,11 +2204,20 @@ def get_all_school_students(
     db: Session = Depends(database.get_db)
 ):
     """Get all students in the school across all classrooms."""
-    students = db.query(models.Student).filter(
+    # Attempts are loaded for the mastery average; the classroom quiz total is a COUNT column
+    students = db.query(
+        models.Student,
+        select(func.count(models.SchoolQuiz.id)).where(
+            models.SchoolQuiz.classroom_id == models.Student.classroom_id
+        ).scalar_subquery()
+    ).options(
+        joinedload(models.Student.classroom),
+        selectinload(models.Student.student_attempts)
+    ).filter(
         models.Student.school_id == school_id
     ).order_by(models.Student.created_at.desc()).all()
     
-    return [
+    return ORJSONResponse([
         {
             "id": s.id,
             "name": s.name,
@@ -1531,12 +2228,12 @@ def get_all_school_students(
             "password": s.password,
             "created_at": s.created_at,
             "attempts_count": len(s.student_attempts),
-            "total_quizzes": len(s.classroom.school_quizzes) if s.classroom else 0,
+            "total_quizzes": quiz_count,
              # Calculate average mastery from attempts if needed, for now placeholder or simple avg
             "mastery": calculate_student_average(s.student_attempts)
         }
-        for s in students
-    ]
+        for s, quiz_count in students
+    ])
 
 @app.get("/api/school/classrooms/{classroom_id}/students")
 def get_classroom_students(
@@ -1554,13 +2251,17 @@ def get_classroom_students(
     if not classroom:
         raise HTTPException(status_code=404, detail="Classroom not found")
     
-    total_classroom_quizzes = len(classroom.school_quizzes)
+    total_classroom_quizzes = db.query(func.count(models.SchoolQuiz.id)).filter(
+        models.SchoolQuiz.classroom_id == classroom_id
+    ).scalar()
 
-    students = db.query(models.Student).filter(
+    students = db.query(models.Student).options(
+        selectinload(models.Student.student_attempts)
+    ).filter(
         models.Student.classroom_id == classroom_id
     ).all()
     
-    return [
+    return ORJSONResponse([
         {
             "id": s.id,
             "name": s.name,
@@ -1573,7 +2274,7 @@ def get_classroom_students(
             "mastery": calculate_student_average(s.student_attempts)
         }
         for s in students
-    ]
+    ])
 
 @app.delete("/api/school/students/{student_id}")
 def delete_student(
@@ -1592,6 +2293,7 @@ def delete_student(
     
     db.delete(student)
     db.commit()
+    invalidate_school_dashboard(school_id)
     
     return {"message": "Student deleted successfully"}
 
@@ -1603,7 +2305,9 @@ def get_school_documents(
     db: Session = Depends(database.get_db)
 ):
     """Get all documents uploaded by the school."""
-    docs = db.query(models.Document).filter(
+    docs = db.query(
+        models.Document.id, models.Document.filename, models.Document.created_at
+    ).filter(
         models.Document.user_id == f"school_{school_id}"
     ).order_by(models.Document.created_at.desc()).all()
     
@@ -1646,38 +2350,37 @@ async def create_school_quiz(
     final_document_id = None
 
     if file:
-        file_path = f"temp_{file.filename}"
-        with open(file_path, "wb") as f:
-            f.write(await file.read())
+        # Streamed to a unique temp file instead of buffering the whole upload in memory
+        file_path, file_hash = await asyncio.to_thread(save_upload_to_temp, file)
+        
+        # Teachers often re-upload the same file; reuse an earlier parse of identical bytes.
+        # School documents carry no owner, so this school's are found through its quizzes.
+        cached_doc = db.query(models.Document).join(
+            models.SchoolQuiz, models.SchoolQuiz.document_id == models.Document.id
+        ).filter(
+            models.SchoolQuiz.school_id == school_id,
+            models.Document.content_hash == file_hash
+        ).first()
         
         try:
-            # Parse document
-            parsing_api_key = os.getenv("LLAMA_CLOUD_API_KEY")
-            if not parsing_api_key:
-                raise HTTPException(status_code=500, detail="LLAMA_CLOUD_API_KEY not set on server.")
-            
-            parser = LlamaParse(
-                api_key=parsing_api_key,
-                result_type="markdown",
-                verbose=True
-            )
-            
-            documents = await parser.aload_data(file_path)
-            if not documents:
-                raise HTTPException(status_code=400, detail="Could not parse document.")
-            
-            context_text = documents[0].text[:15000]
+            if cached_doc is not None:
+                context_text = cached_doc.content
+                print(f"Reusing parsed document {cached_doc.id} for {file.filename}")
+            else:
+                # Full text is stored; student generation takes its own excerpt
+                context_text = await parse_document(file_path)
             
             # Save document to database
             new_doc = models.Document(
                 user_id=None,  # School documents don't belong to individual users
                 filename=file.filename,
-                content=context_text
+                content=context_text,
+                content_hash=file_hash
             )
             db.add(new_doc)
-            db.commit()
-            db.refresh(new_doc)
+            db.flush()
             final_document_id = new_doc.id
+            db.commit()
             
         except Exception as e:
             print(f"Parsing error: {e}")
@@ -1714,12 +2417,14 @@ async def create_school_quiz(
     )
     
     db.add(new_quiz)
+    db.flush()
+    quiz_id = new_quiz.id
     db.commit()
-    db.refresh(new_quiz)
+    invalidate_school_dashboard(school_id)
     
     return {
         "message": "Quiz preparation successful. Students can now generate and take the test.",
-        "quiz_id": new_quiz.id,
+        "quiz_id": quiz_id,
         "document_id": final_document_id
     }
 
@@ -1738,11 +2443,16 @@ def get_classroom_quizzes(
     if not classroom:
         raise HTTPException(status_code=404, detail="Classroom not found")
     
-    quizzes = db.query(models.SchoolQuiz).filter(
+    quizzes = db.query(
+        models.SchoolQuiz,
+        select(func.count(models.StudentAttempt.id)).where(
+            models.StudentAttempt.school_quiz_id == models.SchoolQuiz.id
+        ).scalar_subquery()
+    ).filter(
         models.SchoolQuiz.classroom_id == classroom_id
     ).order_by(models.SchoolQuiz.created_at.desc()).all()
     
-    return [
+    return ORJSONResponse([
         {
             "id": q.id,
             "topic": q.topic,
@@ -1753,10 +2463,10 @@ def get_classroom_quizzes(
             "created_by": q.created_by,
             "created_at": q.created_at,
             "time_limit": q.time_limit,
-            "attempts_count": len(q.student_attempts)
+            "attempts_count": attempts_count
         }
-        for q in quizzes
-    ]
+        for q, attempts_count in quizzes
+    ])
 
 @app.get("/api/school/quizzes/{quiz_id}/results")
 def get_quiz_results(
@@ -1773,11 +2483,13 @@ def get_quiz_results(
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
     
-    attempts = db.query(models.StudentAttempt).filter(
+    attempts = db.query(models.StudentAttempt).options(
+        joinedload(models.StudentAttempt.student)
+    ).filter(
         models.StudentAttempt.school_quiz_id == quiz_id
     ).order_by(models.StudentAttempt.completed_at.desc()).all()
     
-    return {
+    return ORJSONResponse({
         "quiz": {
             "id": quiz.id,
             "topic": quiz.topic,
@@ -1794,23 +2506,36 @@ def get_quiz_results(
             }
             for a in attempts
         ]
-    }
+    })
 
 # --- Student Endpoints ---
 
 @app.post("/api/student/login")
-def login_student(req: StudentLoginRequest, db: Session = Depends(database.get_db)):
+async def login_student(req: StudentLoginRequest, db: AsyncSession = Depends(database.get_async_db)):
     """Student login with student ID and password."""
-    student = db.query(models.Student).filter(
-        models.Student.student_id == req.student_id
-    ).first()
-    
-    if not student:
+    student = (await db.execute(
+        select(models.Student).options(
+            joinedload(models.Student.classroom)
+        ).where(models.Student.student_id == req.student_id)
+    )).scalars().first()
+    
+    # Hand the pooled connection back before the slow hash check (loaded attributes stay readable)
+    await db.close()
+    
+    # Verify password (against a dummy hash for unknown IDs, so both failures take as long)
+    password_ok = await run_password_check(
+        school_auth.verify_password, req.password,
+        student.password_hash if student else school_auth.DUMMY_PASSWORD_HASH
+    )
+    if not student or not password_ok:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    # Verify password
-    if not school_auth.verify_password(req.password, student.password_hash):
-        raise HTTPException(status_code=401, detail="Invalid credentials")
+    if school_auth.needs_rehash(student.password_hash):
+        new_hash = await run_password_check(school_auth.hash_password, req.password)
+        await db.execute(
+            update(models.Student).where(models.Student.id == student.id).values(password_hash=new_hash)
+        )
+        await db.commit()
     
     # Generate token
     token = school_auth.create_access_token(
@@ -1838,12 +2563,17 @@ class StudentProfileUpdate(BaseModel):
     google_api_key: Optional[str] = None
 
 @app.get("/api/student/profile")
-def get_student_profile(
+async def get_student_profile(
     student_id: int = Depends(school_auth.get_current_student_id),
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_async_db)
 ):
     """Get student profile."""
-    student = db.query(models.Student).filter(models.Student.id == student_id).first()
+    student = (await db.execute(
+        select(models.Student).options(
+            joinedload(models.Student.classroom),
+            joinedload(models.Student.school)
+        ).where(models.Student.id == student_id)
+    )).scalars().first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
@@ -1882,25 +2612,32 @@ def update_student_profile(
     db.commit()
     return {"message": "Profile updated successfully"}
 
-@app.get("/api/student/quizzes")
-def get_student_quizzes(
-    student_id: int = Depends(school_auth.get_current_student_id),
-    db: Session = Depends(database.get_db)
+@app.get("/api/student/quizzes", response_model=List[StudentQuizListItem])
+async def get_student_quizzes(
+    student: models.Student = Depends(school_auth.get_current_student),
+    db: AsyncSession = Depends(database.get_async_db)
 ):
     """Get all available quizzes for student."""
-    student = db.query(models.Student).filter(models.Student.id == student_id).first()
-    if not student:
-        raise HTTPException(status_code=404, detail="Student not found")
+    student_id = student.id
     
     # Get all quizzes for student's classroom
-    quizzes = db.query(models.SchoolQuiz).filter(
-        models.SchoolQuiz.classroom_id == student.classroom_id
-    ).order_by(models.SchoolQuiz.created_at.desc()).all()
-    
-    # Check which quizzes student has attempted and get their scores
-    attempts_map = {
-        a.school_quiz_id: a.score for a in student.student_attempts if a.score
-    }
+    quizzes = (await db.execute(
+        select(models.SchoolQuiz).where(
+            models.SchoolQuiz.classroom_id == student.classroom_id
+        ).order_by(models.SchoolQuiz.created_at.desc())
+    )).scalars().all()
+    
+    # Check which of these quizzes the student has attempted and get their scores
+    attempts_map = {}
+    if quizzes:
+        attempts_map = dict((await db.execute(
+            select(models.StudentAttempt.school_quiz_id, models.StudentAttempt.score).where(
+                models.StudentAttempt.student_id == student_id,
+                models.StudentAttempt.school_quiz_id.in_([q.id for q in quizzes]),
+                models.StudentAttempt.score.isnot(None),
+                models.StudentAttempt.score != ""
+            ).order_by(models.StudentAttempt.id)
+        )).all())
     
     return [
         {
@@ -1920,44 +2657,71 @@ def get_student_quizzes(
         for q in quizzes
     ]
 
+# Serialized quiz payload per quiz as (classroom_id, body, etag). It is the same for every
+# student in the classroom and a quiz isn't edited after creation, so entries live longer.
+_student_quiz_cache = TTLCache(maxsize=2048, ttl=600)
+_student_quiz_cache_lock = threading.Lock()
+
+def invalidate_classroom_quizzes(classroom_id: int) -> None:
+    with _student_quiz_cache_lock:
+        for quiz_id in [k for k, v in _student_quiz_cache.items() if v[0] == classroom_id]:
+            _student_quiz_cache.pop(quiz_id, None)
+
 @app.get("/api/student/quizzes/{quiz_id}")
-def get_student_quiz(
+async def get_student_quiz(
     quiz_id: int,
-    student_id: int = Depends(school_auth.get_current_student_id),
-    db: Session = Depends(database.get_db)
+    request: Request,
+    student: models.Student = Depends(school_auth.get_current_student),
+    db: AsyncSession = Depends(database.get_async_db)
 ):
     """Get quiz questions for student to take."""
-    student = db.query(models.Student).filter(models.Student.id == student_id).first()
-    if not student:
-        raise HTTPException(status_code=404, detail="Student not found")
-    
-    quiz = db.query(models.SchoolQuiz).filter(
-        models.SchoolQuiz.id == quiz_id,
-        models.SchoolQuiz.classroom_id == student.classroom_id
-    ).first()
+    with _student_quiz_cache_lock:
+        cached = _student_quiz_cache.get(quiz_id)
+    if cached is None:
+        quiz = (await db.execute(
+            select(models.SchoolQuiz).where(models.SchoolQuiz.id == quiz_id)
+        )).scalars().first()
+        if quiz:
+            # Return quiz without answers
+            body = orjson.dumps({
+                "quiz_id": quiz.id,
+                "topic": quiz.topic,
+                "format": quiz.quiz_format,
+                "questions": quiz.questions.get("questions", []) if quiz.questions else []
+            })
+            cached = (quiz.classroom_id, body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+            with _student_quiz_cache_lock:
+                _student_quiz_cache[quiz_id] = cached
     
-    if not quiz:
+    if cached is None or cached[0] != student.classroom_id:
         raise HTTPException(status_code=404, detail="Quiz not found or not accessible")
     
-    # Return quiz without answers
-    return {
-        "quiz_id": quiz.id,
-        "topic": quiz.topic,
-        "format": quiz.quiz_format,
-        "questions": quiz.questions.get("questions", []) if quiz.questions else []
-    }
+    _, body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=60"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# School quiz prompts include only the start of the source document
+DOCUMENT_EXCERPT_CHARS = 10000
+
+def document_excerpt(db: Session, document_id: Optional[int]) -> str:
+    """Leading DOCUMENT_EXCERPT_CHARS of a document, sliced in SQL so the full content isn't fetched."""
+    if not document_id:
+        return ""
+    return db.execute(
+        select(func.substr(models.Document.content, 1, DOCUMENT_EXCERPT_CHARS)).where(models.Document.id == document_id)
+    ).scalar() or ""
 
 @app.post("/api/student/quizzes/{quiz_id}/generate")
 def generate_student_quiz(
     quiz_id: int,
     req: StudentQuizGenerateRequest,
-    student_id: int = Depends(school_auth.get_current_student_id),
+    student: models.Student = Depends(school_auth.get_current_student),
     db: Session = Depends(database.get_db)
 ):
     """Generate quiz questions for a student using their API key."""
-    student = db.query(models.Student).filter(models.Student.id == student_id).first()
-    if not student:
-        raise HTTPException(status_code=404, detail="Student not found")
+    student_id = student.id
     
     quiz = db.query(models.SchoolQuiz).filter(
         models.SchoolQuiz.id == quiz_id,
@@ -1982,54 +2746,30 @@ def generate_student_quiz(
             "questions": existing_attempt.questions
         }
 
-    # Get Doc Content
-    doc_content = ""
-    if quiz.document_id:
-        doc = db.query(models.Document).filter(models.Document.id == quiz.document_id).first()
-        if doc and doc.content:
-            doc_content = doc.content
+    doc_content = document_excerpt(db, quiz.document_id)
             
-    prompt = f"""
-    Create a {quiz.difficulty} difficulty quiz about {quiz.topic}.
-    Format: {quiz.quiz_format}
-    Number of questions: {quiz.num_questions}
-    
-    Context from document:
-    {doc_content[:10000]}
-    
-    Additional Notes: {quiz.additional_notes or "None"}
-    
-    Return ONLY valid JSON in this format:
-    {{
-      "questions": [
-        {{
-          "id": 1,
-          "text": "Question text",
-          "type": "objective", # MUST match the format requested
-          "options": ["Option 1", "Option 2", "Option 3", "Option 4"], 
-          "correct_answer": "Exact text of the correct option"
-        }}
-      ]
-    }}
-    STRICT RULES:
-    1. STRICT FORMAT ADHERENCE: You MUST ONLY generate questions for the requested format "{quiz.quiz_format}". DO NOT MIX TYPES.
-    2. If format is "objective" or "Multiple Choice": Every question MUST be multiple choice with 4 distinct options. The "type" MUST be "objective".
-    3. If format is "theory" or "subjective" or "Free Text": Every question MUST be open-ended. The "options" MUST be null. The "type" MUST be "theory". The "correct_answer" MUST be a detailed model answer for evaluation.
-    4. If format is "fill in the blank": Every question MUST have a sentence with a missing word/phrase indicated by "____". The "type" MUST be "fill_in_the_blank". The "options" MUST be null. The "correct_answer" MUST be the exact word/phrase.
-    5. No markdown. No comments. No extra text.
-    """
+    prompt_prefix = _STUDENT_QUIZ_PREFIX.format_map({
+        "doc_content": doc_content,
+        "quiz_format": quiz.quiz_format,
+    })
+    prompt_tail = _STUDENT_QUIZ_TAIL.format_map({
+        "difficulty": quiz.difficulty,
+        "topic": quiz.topic,
+        "quiz_format": quiz.quiz_format,
+        "num_questions": quiz.num_questions,
+        "additional_notes": quiz.additional_notes or "None",
+    })
 
     try:
         client = get_gemini_client(req.api_key)
-        response = client.models.generate_content(
-            model=get_gemini_model_name(),
-            contents=prompt
+        response = generate_with_cached_prefix(
+            client, req.api_key, ("student-quiz", quiz.document_id, quiz.quiz_format),
+            prompt_prefix, prompt_tail
         )
         
         raw_text = response.text
         print(f"DEBUG RAW AI: {raw_text}") # Debug AI response
-        text = clean_json_text(raw_text)
-        quiz_json = json.loads(text)
+        quiz_json = parse_model_json(raw_text)
         
     except Exception as e:
         print(f"Error generating quiz for ID {quiz_id}: {e}")
@@ -2041,40 +2781,48 @@ def generate_student_quiz(
              
         raise HTTPException(status_code=500, detail=f"AI Generation Failed: {str(e)}. Please check your API key and model access.")
 
+    # Normalized answers are stored beside the questions so objective grading doesn't redo it
+    # per submission, without adding an internal field to the questions served to clients
+    correct_answers_norm = {
+        str(q.get("id")): normalize_answer(q.get("correct_answer"))
+        for q in quiz_json["questions"] if isinstance(q, dict)
+    }
+
     if existing_attempt:
         attempt = existing_attempt
         attempt.questions = quiz_json["questions"]
+        attempt.correct_answers_norm = correct_answers_norm
     else:
         attempt = models.StudentAttempt(
             student_id=student_id,
             school_quiz_id=quiz.id,
             questions=quiz_json["questions"],
+            correct_answers_norm=correct_answers_norm,
             score=None,
             answers=None,
             feedback=None
         )
         db.add(attempt)
     
+    db.flush()
+    attempt_id = attempt.id
     db.commit()
-    db.refresh(attempt)
 
     return {
         "message": "Quiz generated successfully",
-        "attempt_id": attempt.id,
-        "questions": attempt.questions
+        "attempt_id": attempt_id,
+        "questions": quiz_json["questions"]
     }
 
 @app.post("/api/student/quizzes/{quiz_id}/submit")
 def submit_student_quiz(
     quiz_id: int,
     req: StudentQuizSubmitRequest,
-    student_id: int = Depends(school_auth.get_current_student_id),
+    student: models.Student = Depends(school_auth.get_current_student),
     db: Session = Depends(database.get_db)
 ):
     """Submit quiz answers using student's API key."""
-    student = db.query(models.Student).filter(models.Student.id == student_id).first()
-    if not student:
-        raise HTTPException(status_code=404, detail="Student not found")
+    student_id = student.id
     
     quiz = db.query(models.SchoolQuiz).filter(
         models.SchoolQuiz.id == quiz_id,
@@ -2090,8 +2838,10 @@ def submit_student_quiz(
         models.StudentAttempt.school_quiz_id == quiz_id
     ).order_by(models.StudentAttempt.completed_at.desc()).first()
 
+    correct_answers_norm = {}
     if attempt:
         questions = attempt.questions
+        correct_answers_norm = attempt.correct_answers_norm or {}
     else:
         # Fallback to quiz template if no specific attempt exists
         questions = quiz.questions.get("questions", []) if quiz.questions else []
@@ -2103,17 +2853,14 @@ def submit_student_quiz(
     if is_objective:
         # LOCAL GRADING - NO AI CALL (Optimized)
         results = []
-        correct_count = 0
         for q in questions:
-            q_id = str(q.get("id"))
-            student_answer = req.answers.get(q_id)
+            student_answer = req.answers.get(str(q.get("id")))
             correct_answer = q.get("correct_answer")
+            correct_norm = correct_answers_norm.get(str(q.get("id")))
+            if correct_norm is None:  # attempts generated before answers were pre-normalized
+                correct_norm = normalize_answer(correct_answer)
             
-            is_correct = False
-            if student_answer and correct_answer:
-                if str(student_answer).strip().lower() == str(correct_answer).strip().lower():
-                    is_correct = True
-                    correct_count += 1
+            is_correct = bool(student_answer and correct_answer) and normalize_answer(student_answer) == correct_norm
             
             results.append({
                 "id": q.get("id"),
@@ -2122,6 +2869,7 @@ def submit_student_quiz(
                 "feedback": "Correct!" if is_correct else f"Incorrect. The correct answer was: {correct_answer}"
             })
         
+        correct_count = sum(1 for r in results if r["correct"])
         evaluation = {
             "score": f"{correct_count}/{len(questions)}",
             "results": results
@@ -2131,29 +2879,22 @@ def submit_student_quiz(
         try:
             client = get_gemini_client(req.api_key)
             
-            submission_str = json.dumps(req.answers, indent=2)
-            questions_str = json.dumps(questions, indent=2)
+            items = compact_theory_items(questions, req.answers)
             
             # Get Doc Content for context if available
             doc_context = ""
-            if quiz.document_id:
-                doc = db.query(models.Document).filter(models.Document.id == quiz.document_id).first()
-                if doc and doc.content:
-                    doc_context = f"Document Context:\n{doc.content[:10000]}\n"
+            doc_content = document_excerpt(db, quiz.document_id)
+            if doc_content:
+                doc_context = f"Document Context:\n{doc_content}\n"
 
-            prompt = f"""
+            # Document context and grading rules first (cacheable per document), then this submission
+            prompt_prefix = f"""
             Evaluate this subjective/theory quiz submission.
             
             {doc_context}
             
-            Original Questions & Model Answers (Reference for Grading):
-            {questions_str}
-            
-            Student Submission:
-            {submission_str}
-            
             Task:
-            - For each question, compare the student's answer to the "correct_answer" (Model Answer) provided in the reference.
+            - For each question, compare the student's answer ("ans") to the model answer ("model") provided in the reference below.
             - Award a score between 0.0 and 1.0 for each question based on conceptual accuracy and completeness.
             - SCORING RULES:
               1. If the answer is close but missing the main points, award 0.5 to 0.8.
@@ -2173,17 +2914,33 @@ def submit_student_quiz(
               ]
             }}
             """
+            def evaluate_items(batch: List[Dict]) -> List[Dict]:
+                prompt_tail = f"""
+            Questions (q), Model Answers (model) and Student Answers (ans):
+            {_dumps(batch)}
+            """
+                cache_key = ai_response_cache_key(get_gemini_model_name(), prompt_prefix, prompt_tail)
+                raw_text = get_cached_ai_text(cache_key)
+                if raw_text is None:
+                    response = generate_with_cached_prefix(
+                        client, req.api_key, ("student-eval", quiz.document_id), prompt_prefix, prompt_tail
+                    )
+                    raw_text = response.text
+                    results = parse_model_json(raw_text).get("results", [])
+                    cache_ai_text(cache_key, raw_text)
+                    return results
+                return parse_model_json(raw_text).get("results", [])
             
-            response = client.models.generate_content(
-                model=get_gemini_model_name(),
-                contents=prompt
-            )
-            raw_text = response.text
-            text = clean_json_text(raw_text)
-            evaluation = json.loads(text)
+            # Long theory quizzes are graded as concurrent batches and the results merged
+            if len(items) > THEORY_EVAL_MAX_SINGLE:
+                batches = [items[i:i + THEORY_EVAL_BATCH_SIZE] for i in range(0, len(items), THEORY_EVAL_BATCH_SIZE)]
+                with ThreadPoolExecutor(max_workers=min(len(batches), AI_MAX_CONCURRENCY)) as pool:
+                    results = [r for batch_results in pool.map(evaluate_items, batches) for r in batch_results]
+            else:
+                results = evaluate_items(items)
+            evaluation = {"results": results}
             
             # Force score calculation with fractional support
-            results = evaluation.get("results", [])
             total_obtained = 0
             for r in results:
                 if "score" in r:
@@ -2204,8 +2961,10 @@ def submit_student_quiz(
             print(f"Error evaluating quiz: {e}")
             raise HTTPException(status_code=500, detail=f"AI Evaluation Failed: {str(e)}")
 
+    score = evaluation.get("score", "0/0")
     if attempt:
-        attempt.score = evaluation.get("score", "0/0")
+        attempt.score = score
+        attempt.score_percentage = score_percentage_value(score)
         attempt.answers = req.answers
         attempt.feedback = evaluation.get("results", [])
         attempt.completed_at = datetime.datetime.utcnow()
@@ -2213,7 +2972,8 @@ def submit_student_quiz(
         attempt = models.StudentAttempt(
             student_id=student_id,
             school_quiz_id=quiz_id,
-            score=evaluation.get("score", "0/0"),
+            score=score,
+            score_percentage=score_percentage_value(score),
             answers=req.answers,
             feedback=evaluation.get("results", []),
             questions=questions,
@@ -2221,47 +2981,51 @@ def submit_student_quiz(
         )
         db.add(attempt)
 
+    db.flush()
+    attempt_id = attempt.id
     db.commit()
-    db.refresh(attempt)
+    invalidate_school_dashboard(student.school_id)
     
     return {
-        "attempt_id": attempt.id,
+        "attempt_id": attempt_id,
         "score": evaluation.get("score"),
         "results": evaluation.get("results", [])
     }
 
-@app.get("/api/student/attempts")
-def get_student_attempts(
+@app.get("/api/student/attempts", response_model=List[StudentAttemptItem])
+async def get_student_attempts(
     student_id: int = Depends(school_auth.get_current_student_id),
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_async_db)
 ):
     """Get student's quiz history."""
-    attempts = db.query(models.StudentAttempt).filter(
-        models.StudentAttempt.student_id == student_id,
-        models.StudentAttempt.completed_at != None
-    ).order_by(models.StudentAttempt.completed_at.desc()).all()
-    
-    return [
-        {
-            "id": a.id,
-            "quiz_topic": a.school_quiz.topic,
-            "score": a.score,
-            "completed_at": a.completed_at
-        }
-        for a in attempts
-    ]
+    # The four response columns with the topic joined in; rows go straight to the response model
+    return (await db.execute(
+        select(
+            models.StudentAttempt.id,
+            models.SchoolQuiz.topic.label("quiz_topic"),
+            models.StudentAttempt.score,
+            models.StudentAttempt.completed_at
+        ).join(models.SchoolQuiz).where(
+            models.StudentAttempt.student_id == student_id,
+            models.StudentAttempt.completed_at != None
+        ).order_by(models.StudentAttempt.completed_at.desc())
+    )).all()
 
 @app.get("/api/student/attempts/{attempt_id}")
-def get_attempt_details(
+async def get_attempt_details(
     attempt_id: int,
     student_id: int = Depends(school_auth.get_current_student_id),
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_async_db)
 ):
     """Get detailed attempt history with questions and feedback."""
-    attempt = db.query(models.StudentAttempt).filter(
-        models.StudentAttempt.id == attempt_id,
-        models.StudentAttempt.student_id == student_id
-    ).first()
+    attempt = (await db.execute(
+        select(models.StudentAttempt).options(
+            joinedload(models.StudentAttempt.school_quiz)
+        ).where(
+            models.StudentAttempt.id == attempt_id,
+            models.StudentAttempt.student_id == student_id
+        )
+    )).scalars().first()
     
     if not attempt:
         raise HTTPException(status_code=404, detail="Attempt not found")
@@ -2278,12 +3042,12 @@ def get_attempt_details(
     }
 
 @app.get("/api/student/analysis")
-def get_student_analysis(
+async def get_student_analysis(
     student_id: int = Depends(school_auth.get_current_student_id),
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_async_db)
 ):
     """AI-powered analysis of student progress."""
-    student = db.query(models.Student).filter(models.Student.id == student_id).first()
+    student = await db.get(models.Student, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
@@ -2299,10 +3063,16 @@ def get_student_analysis(
         }
     
     # Get all student attempts
-    attempts = db.query(models.StudentAttempt).filter(
-        models.StudentAttempt.student_id == student_id,
-        models.StudentAttempt.score != None  # Only completed attempts
-    ).order_by(models.StudentAttempt.completed_at.asc()).all()
+    attempts = (await db.execute(
+        select(models.StudentAttempt).options(
+            joinedload(models.StudentAttempt.school_quiz)
+        ).where(
+            models.StudentAttempt.student_id == student_id,
+            models.StudentAttempt.score != None  # Only completed attempts
+        ).order_by(models.StudentAttempt.completed_at.asc())
+    )).scalars().all()
+    # Everything needed is loaded; don't hold a pooled connection through the model call
+    await db.close()
     
     if not attempts:
         return {
@@ -2316,21 +3086,14 @@ def get_student_analysis(
     # Prepare data for AI analysis
     attempt_data = []
     for a in attempts:
-        score_parts = a.score.split("/") if a.score else ["0", "1"]
-        try:
-            correct = float(score_parts[0]) if len(score_parts) > 0 else 0
-            total = float(score_parts[1]) if len(score_parts) > 1 else 1
-        except (ValueError, TypeError):
-            correct = 0
-            total = 1
-        percentage = (correct / total * 100) if total > 0 else 0
+        percentage = a.score_percentage if a.score_percentage is not None else score_percentage_value(a.score) or 0.0
         
         attempt_data.append({
             "quiz_topic": a.school_quiz.topic,
             "format": a.school_quiz.quiz_format,
             "difficulty": a.school_quiz.difficulty,
             "score": a.score,
-            "percentage": round(percentage, 1),
+            "percentage": percentage,
             "date": str(a.completed_at),
             "num_questions": len(a.questions) if a.questions else 0
         })
@@ -2343,7 +3106,7 @@ def get_student_analysis(
     Total Quizzes Completed: {len(attempts)}
     
     Performance History:
-    {json.dumps(attempt_data, indent=2)}
+    {_dumps(attempt_data)}
     
     Task:
     Provide a comprehensive analysis in JSON format with:
@@ -2366,14 +3129,21 @@ def get_student_analysis(
     
     try:
         client = get_gemini_client(student.google_api_key)
-        response = client.models.generate_content(
+        # Unchanged history gives the same prompt, so the earlier analysis is served again
+        cache_key = ai_response_cache_key(get_gemini_model_name(), prompt)
+        raw_text = get_cached_ai_text(cache_key)
+        if raw_text is not None:
+            return parse_model_json(raw_text)
+        
+        # The async client shares the keep-alive pool with every other coroutine on the loop
+        response = await client.aio.models.generate_content(
             model=get_gemini_model_name(),
             contents=prompt
         )
         
         raw_text = response.text
-        text = clean_json_text(raw_text)
-        analysis = json.loads(text)
+        analysis = parse_model_json(raw_text)
+        cache_ai_text(cache_key, raw_text)
         
         return analysis
         
@@ -2381,112 +3151,88 @@ def get_student_analysis(
         print(f"Error generating analysis: {e}")
         raise HTTPException(status_code=500, detail=f"AI Analysis Failed: {str(e)}")
 
-@app.get("/api/school/dashboard/overview")
-def get_school_dashboard(
-    school_id: int = Depends(school_auth.get_current_school_id),
-    db: Session = Depends(database.get_db)
-):
-    """Get school dashboard overview statistics."""
-    school = db.query(models.School).filter(models.School.id == school_id).first()
-    if not school:
-        raise HTTPException(status_code=404, detail="School not found")
-    
-    total_classrooms = len(school.classrooms)
-    total_students = len(school.students)
-    total_quizzes = len(school.school_quizzes)
-    
-    # Get recent activity
-    recent_attempts = db.query(models.StudentAttempt).join(
-        models.Student
-    ).filter(
-        models.Student.school_id == school_id
-    ).order_by(
-        models.StudentAttempt.completed_at.desc()
-    ).limit(10).all()
-    
-    return {
-        "school": {
-            "name": school.name,
-            "country": school.country
-        },
-        "statistics": {
-            "total_classrooms": total_classrooms,
-            "total_students": total_students,
-            "total_quizzes": total_quizzes
-        },
-        "recent_activity": [
-            {
-                "student_name": a.student.name,
-                "quiz_topic": a.school_quiz.topic,
-                "score": a.score,
-                "completed_at": a.completed_at
-            }
-            for a in recent_attempts
-        ]
-    }
-
 @app.get("/api/school/analytics")
-def get_school_analytics(
-    school_id: int = Depends(school_auth.get_current_school_id),
-    db: Session = Depends(database.get_db)
+async def get_school_analytics(
+    school_id: int = Depends(school_auth.get_current_school_id)
 ):
     """Get aggregated school analytics."""
-    school = db.query(models.School).filter(models.School.id == school_id).first()
-    if not school:
+    # The trend covers the current calendar month and the five before it, keyed by (year, month)
+    now = datetime.datetime.utcnow()
+    month_index = now.year * 12 + now.month - 1
+    months = [((month_index - i) // 12, (month_index - i) % 12 + 1) for i in range(5, -1, -1)]
+    six_months_ago = datetime.datetime(months[0][0], months[0][1], 1)
+    year_col = extract("year", models.StudentAttempt.completed_at)
+    month_col = extract("month", models.StudentAttempt.completed_at)
+    
+    # The reads below are independent, so they run concurrently on separate connections
+    school_rows, monthly_rows, classrooms, class_rows, student_count_rows, recent_rows = await run_concurrent_reads(
+        select(models.School.id).where(models.School.id == school_id),
+        # Attempts of the last 6 months, counted per (year, month, score) instead of loaded row by row
+        select(year_col, month_col, models.StudentAttempt.score, func.count()).join(
+            models.Student
+        ).where(
+            models.Student.school_id == school_id,
+            models.StudentAttempt.completed_at >= six_months_ago
+        ).group_by(year_col, month_col, models.StudentAttempt.score),
+        select(models.Classroom.id, models.Classroom.name).where(models.Classroom.school_id == school_id),
+        # One GROUP BY over every classroom's attempts rather than a query per classroom
+        select(models.Student.classroom_id, models.StudentAttempt.score, func.count()).join(
+            models.Student
+        ).where(
+            models.Student.school_id == school_id
+        ).group_by(models.Student.classroom_id, models.StudentAttempt.score),
+        select(func.count(models.Student.id)).where(models.Student.school_id == school_id),
+        select(models.StudentAttempt).join(
+            models.Student
+        ).options(
+            load_only(models.StudentAttempt.score, models.StudentAttempt.completed_at),
+            contains_eager(models.StudentAttempt.student),
+            joinedload(models.StudentAttempt.school_quiz).load_only(models.SchoolQuiz.topic)
+        ).where(
+            models.Student.school_id == school_id,
+            models.StudentAttempt.completed_at >= six_months_ago
+        ).order_by(models.StudentAttempt.completed_at.desc()).limit(5)
+    )
+    if not school_rows:
         raise HTTPException(status_code=404, detail="School not found")
 
     # 1. Monthly Performance Trends (Growth Chart)
-    # Get all attempts for this school in the last 6 months
-    six_months_ago = datetime.datetime.utcnow() - datetime.timedelta(days=180)
-    
-    attempts = db.query(models.StudentAttempt).join(
-        models.Student
-    ).filter(
-        models.Student.school_id == school_id,
-        models.StudentAttempt.completed_at >= six_months_ago
-    ).all()
-
-    # Aggregate by month
+    # Aggregate by month; zero scores are left out of the trend, as before
     monthly_data = {}
-    for a in attempts:
-        if not a.completed_at: continue
-        month_key = a.completed_at.strftime("%b")
-        if month_key not in monthly_data:
-            monthly_data[month_key] = {"total_score": 0, "count": 0}
-        
-        score_val = calculate_student_average([a]) # Use existing helper for single attempt
+    for year, month, score, count in monthly_rows:
+        month_key = (int(year), int(month))
+        pct = score_to_percentage(score) if score else None
+        score_val = round(pct, 1) if pct is not None else 0
         if score_val > 0:
-            monthly_data[month_key]["total_score"] += score_val
-            monthly_data[month_key]["count"] += 1
+            entry = monthly_data.setdefault(month_key, {"total_score": 0, "count": 0})
+            entry["total_score"] += score_val * count
+            entry["count"] += count
 
     growth_trends = []
     # Ensure all 6 months are present, even if empty
-    for i in range(5, -1, -1):
-        m = (datetime.datetime.utcnow() - datetime.timedelta(days=i*30)).strftime("%b")
-        avg = round(monthly_data[m]["total_score"] / monthly_data[m]["count"], 1) if m in monthly_data and monthly_data[m]["count"] > 0 else 0
-        growth_trends.append({"month": m, "score": avg})
+    for year, month in months:
+        entry = monthly_data.get((year, month))
+        avg = round(entry["total_score"] / entry["count"], 1) if entry and entry["count"] > 0 else 0
+        growth_trends.append({"month": datetime.date(year, month, 1).strftime("%b"), "score": avg})
 
     # 2. Classroom Performance Distribution (Pie/Bar Chart)
-    classrooms = db.query(models.Classroom).filter(models.Classroom.school_id == school_id).all()
-    classroom_dist = []
-    for c in classrooms:
-        class_attempts = db.query(models.StudentAttempt).join(
-            models.Student
-        ).filter(
-            models.Student.classroom_id == c.id
-        ).all()
-        avg_score = calculate_student_average(class_attempts)
-        classroom_dist.append({"name": c.name, "value": avg_score})
+    class_scores = {}
+    for classroom_id, score, count in class_rows:
+        class_scores.setdefault(classroom_id, []).append((score, count))
+    classroom_dist = [
+        {"name": c.name, "value": average_score_counts(class_scores.get(c.id, []))}
+        for c in classrooms
+    ]
 
     # 3. Overall Statistics
-    total_classrooms = len(school.classrooms)
-    total_students = len(school.students)
-    overall_avg = calculate_student_average(attempts) # Using all 6 months' attempts for overall avg
+    total_classrooms = len(classrooms)
+    total_students = student_count_rows[0][0]
+    # Using all 6 months' attempts for overall avg
+    overall_avg = average_score_counts((score, count) for _, _, score, count in monthly_rows)
     
     # 4. Recent Activity
     recent_activity = []
-    sorted_attempts = sorted(attempts, key=lambda x: x.completed_at, reverse=True)[:5]
-    for a in sorted_attempts:
+    for (a,) in recent_rows:
         recent_activity.append({
             "title": f"{a.school_quiz.topic}: Attempt Logged",
             "user": a.student.name,
@@ -2509,12 +3255,12 @@ def get_school_analytics(
 # --- Individual Portal Endpoints ---
 
 @app.get("/api/individual/profile")
-def get_individual_profile(
+async def get_individual_profile(
     individual_id: int = Depends(individual_auth.get_current_individual_id),
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_async_db)
 ):
     """Get individual user profile."""
-    individual = db.query(models.Individual).filter(models.Individual.id == individual_id).first()
+    individual = await db.get(models.Individual, individual_id)
     if not individual:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -2548,79 +3294,65 @@ def update_individual_settings(
     return {"message": "Settings updated successfully"}
 
 @app.get("/api/individual/dashboard")
-def get_individual_dashboard(
+async def get_individual_dashboard(
     individual_id: int = Depends(individual_auth.get_current_individual_id),
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_async_db)
 ):
     """Get dashboard statistics for individual users."""
-    total_quizzes = db.query(models.Quiz).filter(
-        models.Quiz.user_id == str(individual_id)
-    ).count()
-    
-    total_attempts = db.query(models.Attempt).filter(
-        models.Attempt.user_id == str(individual_id),
-        models.Attempt.score.isnot(None)
-    ).count()
-    
-    attempts = db.query(models.Attempt).filter(
-        models.Attempt.user_id == str(individual_id),
-        models.Attempt.score.isnot(None)
-    ).all()
+    user_id = str(individual_id)
+    total_quizzes = (await db.execute(
+        select(func.count(models.Quiz.id)).where(models.Quiz.user_id == user_id)
+    )).scalar()
+    
+    # Every scored attempt as plain columns (oldest first); the counts, average and
+    # recent list are all derived from this one result
+    attempts = (await db.execute(
+        select(
+            models.Attempt.id,
+            models.Attempt.score,
+            models.Attempt.score_percentage,
+            models.Attempt.timestamp,
+            models.Quiz.topic
+        ).outerjoin(
+            models.Quiz, models.Attempt.quiz_id == models.Quiz.id
+        ).where(
+            models.Attempt.user_id == user_id,
+            models.Attempt.score.isnot(None)
+        ).order_by(models.Attempt.timestamp.asc())
+    )).all()
     
-    avg_score = 0
-    if attempts:
-        total_score = 0
-        for a in attempts:
-            if '%' in a.score:
-                total_score += int(a.score.split('%')[0])
-            elif '/' in a.score:
-                parts = a.score.split('/')
-                try:
-                    num = float(parts[0])
-                    den = float(parts[1])
-                    if den > 0:
-                        total_score += (num / den) * 100
-                except:
-                    pass
-        avg_score = round(total_score / len(attempts), 1)
+    percentages = [a.score_percentage for a in attempts if a.score_percentage is not None]
+    avg_score = round(sum(percentages) / len(percentages), 1) if percentages else 0
     
     seven_days_ago = datetime.datetime.utcnow() - datetime.timedelta(days=7)
-    recent_attempts = db.query(models.Attempt).filter(
-        models.Attempt.user_id == str(individual_id),
-        models.Attempt.timestamp >= seven_days_ago,
-        models.Attempt.score.isnot(None)
-    ).order_by(models.Attempt.timestamp.desc()).limit(5).all()
+    recent_attempts = [
+        a for a in reversed(attempts) if a.timestamp and a.timestamp >= seven_days_ago
+    ][:5]
     
-    # Get all successful attempts for history chart
-    all_attempts = db.query(models.Attempt).filter(
-        models.Attempt.user_id == str(individual_id),
-        models.Attempt.score.isnot(None)
-    ).order_by(models.Attempt.timestamp.asc()).all()
-    
-    return {
+    return ORJSONResponse({
         "total_quizzes": total_quizzes,
-        "total_attempts": total_attempts,
+        "total_attempts": len(attempts),
         "avg_score": avg_score,
         "recent_activity": [
             {
                 "id": a.id,
-                "quiz_topic": a.quiz.topic if a.quiz else "Unknown",
-                "score": f"{round((float(a.score.split('/')[0])/float(a.score.split('/')[1])*100), 1) if '/' in a.score and float(a.score.split('/')[1])>0 else 0}%",
+                "quiz_topic": a.topic if a.topic is not None else "Unknown",
+                "score": percentage_label(a.score_percentage, a.score),
                 "mark": a.score,
-                "timestamp": a.timestamp.strftime("%b %d, %Y")
+                "timestamp": display_date(a.timestamp)
             }
             for a in recent_attempts
         ],
         "performance_history": [
             {
                 "id": a.id,
-                "quiz_topic": a.quiz.topic if a.quiz else "Unknown",
-                "score": f"{round((float(a.score.split('/')[0])/float(a.score.split('/')[1])*100), 1) if '/' in a.score and float(a.score.split('/')[1])>0 else 0}%",
-                "timestamp": a.timestamp.strftime("%b %d, %Y")
+                "quiz_topic": a.topic if a.topic is not None else "Unknown",
+                "score": percentage_label(a.score_percentage, a.score),
+                "timestamp": display_date(a.timestamp)
             }
-            for a in all_attempts
+            for a in attempts
         ]
-    }
+    })
 
 @app.get("/api/individual/quizzes")
 def get_individual_quizzes(
@@ -2628,31 +3360,100 @@ def get_individual_quizzes(
     db: Session = Depends(database.get_db)
 ):
     """Get all quizzes created by individual user."""
-    quizzes = db.query(models.Quiz).filter(
-        models.Quiz.user_id == str(individual_id)
-    ).order_by(models.Quiz.created_at.desc()).all()
-    
-    
-    results = []
-    for q in quizzes:
-        is_completed = db.query(models.Attempt).filter(
-            models.Attempt.quiz_id == q.id,
+    user_id = str(individual_id)
+    # Column-only rows streamed in batches; completion is an EXISTS column, not a COUNT per quiz
+    quizzes = db.query(models.Quiz).with_entities(
+        models.Quiz.id,
+        models.Quiz.topic,
+        models.Quiz.quiz_format,
+        models.Quiz.num_questions,
+        models.Quiz.difficulty,
+        models.Quiz.created_at,
+        select(models.Attempt.id).where(
+            models.Attempt.quiz_id == models.Quiz.id,
             models.Attempt.score.isnot(None)
-        ).count() > 0
-        
-        results.append({
+        ).exists().label("is_completed")
+    ).filter(
+        models.Quiz.user_id == user_id
+    ).order_by(models.Quiz.created_at.desc()).yield_per(500)
+    
+    return [
+        {
             "id": q.id,
             "topic": q.topic,
             "quiz_format": q.quiz_format,
             "num_questions": q.num_questions,
             "difficulty": q.difficulty,
-            "created_at": q.created_at.strftime("%b %d, %Y") if q.created_at else "Unknown",
-            "is_completed": is_completed
-        })
-    return results
+            "created_at": display_date(q.created_at),
+            "is_completed": bool(q.is_completed)
+        }
+        for q in quizzes
+    ]
+
+# Individual quiz prompts include only the start of the source document
+INDIVIDUAL_CONTEXT_CHARS = 15000
+
+# Background generation state is kept on the quiz row (Quiz.generation_status) so every worker
+# sees it. A quiz still "generating" after this long was interrupted, e.g. by a restart.
+INDIVIDUAL_GENERATION_TIMEOUT = datetime.timedelta(minutes=10)
+
+def individual_quiz_generating(generation_status: Optional[str], created_at: Optional[datetime.datetime]) -> bool:
+    """Whether an individual quiz's questions are still being generated in the background."""
+    return (
+        generation_status == "generating"
+        and created_at is not None
+        and datetime.datetime.utcnow() - created_at < INDIVIDUAL_GENERATION_TIMEOUT
+    )
+
+def set_individual_generation_status(db: Session, quiz_id: int, generation_status: str) -> None:
+    db.execute(update(models.Quiz).where(models.Quiz.id == quiz_id).values(generation_status=generation_status))
+
+async def generate_individual_questions(quiz_id: int, prompts: List[str], api_key: str, quiz_format: str, context: Optional[str] = None):
+    """Generate and store an individual quiz's questions; runs as a background task after the response."""
+    try:
+        questions = await generate_quiz_questions_batched(prompts, api_key, context)
+        
+        # DEBUG LOGGING for User
+        if questions:
+            print(f"\n--- AI GENERATED QUESTIONS ({quiz_format}) ---")
+            print(_dumps(questions, indent=True))
+            print("------------------------------------------\n")
+        else:
+            print("\n--- AI GENERATED NO QUESTIONS ---\n")
+            print("AI generation returned empty, using fallback.")
+        
+        # Insert all questions in one executemany round-trip
+        question_rows = [
+            {
+                "quiz_id": quiz_id,
+                "text": q_data.get('question', 'Question text missing'),
+                "options": q_data.get('options'),
+                "correct_answer": q_data.get('correct_answer', ''),
+                "correct_answer_norm": normalize_answer(q_data.get('correct_answer', '')),
+                "question_type": quiz_format
+            }
+            for q_data in questions or []
+        ]
+        # The questions and the final status are committed together
+        with database.SessionLocal() as db:
+            if question_rows:
+                db.execute(insert(models.Question), question_rows)
+            set_individual_generation_status(db, quiz_id, "ready" if question_rows else "failed")
+            db.commit()
+    except Exception as e:
+        print(f"Background question generation failed for quiz {quiz_id}: {e}")
+        with database.SessionLocal() as db:
+            set_individual_generation_status(db, quiz_id, "failed")
+            db.commit()
+
+def get_individual_google_key(individual_id: int) -> Optional[str]:
+    """Individual's Google API key, read on its own session so it can run on a worker thread."""
+    with database.SessionLocal() as db:
+        return db.query(models.Individual.google_api_key).filter(models.Individual.id == individual_id).scalar()
 
 @app.post("/api/individual/quizzes")
 async def create_individual_quiz(
+    background_tasks: BackgroundTasks,
     topic: str = Form(None),
     quiz_format: str = Form("multiple_choice"),
     num_questions: int = Form(5),
@@ -2664,148 +3465,167 @@ async def create_individual_quiz(
     db: Session = Depends(database.get_db)
 ):
     """Create a new quiz for individual practice with optional document upload."""
-    
-    file_content = ""
-    file_name_for_doc = ""
-    
-    # 1. Handle File Upload (and save as Document)
-    if file:
-        file_name_for_doc = file.filename
-        base_dir = f"uploads/individuals/{individual_id}"
-        os.makedirs(base_dir, exist_ok=True)
-        file_path = f"{base_dir}/{file.filename}"
+    user_id = str(individual_id)
+    # The API key lookup runs on a worker thread while the upload is saved and parsed
+    api_key_task = asyncio.create_task(asyncio.to_thread(get_individual_google_key, individual_id))
+    try:
+        file_content = ""
+        file_name_for_doc = ""
+    
+        # 1. Handle File Upload (and save as Document)
+        if file:
+            file_name_for_doc = file.filename
+            base_dir = f"uploads/individuals/{individual_id}"
+            os.makedirs(base_dir, exist_ok=True)
+            file_path = f"{base_dir}/{file.filename}"
         
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        try:
-            parsing_api_key = os.getenv("LLAMA_CLOUD_API_KEY")
-            if parsing_api_key:
-                print("Using LlamaParse for document...")
-                parser = LlamaParse(api_key=parsing_api_key, result_type="markdown", verbose=True)
-                documents = await parser.aload_data(file_path)
-                if documents:
-                    file_content = documents[0].text
-                    print(f"LlamaParse success. Content length: {len(file_content)}")
+            file_hash = await asyncio.to_thread(write_upload, file, file_path)
+        
+            # Re-uploads of a file this individual already has reuse its earlier parse
+            cached_doc = db.query(
+                models.Document.id,
+                func.substr(models.Document.content, 1, INDIVIDUAL_CONTEXT_CHARS).label("excerpt")
+            ).filter(
+                models.Document.individual_id == individual_id,
+                models.Document.content_hash == file_hash
+            ).first()
+        
+            parsed = False
+            if cached_doc is not None:
+                file_content = cached_doc.excerpt
+                print(f"Reusing parsed document {cached_doc.id} for {file.filename}")
             else:
-                 print("LLAMA_CLOUD_API_KEY missing. Fallback read.")
-                 with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                    file_content = f.read()
-        except Exception as e:
-            print(f"Parsing error: {e}")
-            try:
-                with open(file_path, "r", encoding="utf-8", errors="ignore") as f: file_content = f.read()
-            except: file_content = ""
+                try:
+                    parsing_api_key = os.getenv("LLAMA_CLOUD_API_KEY")
+                    if parsing_api_key:
+                        print("Using LlamaParse for document...")
+                        parser = LlamaParse(api_key=parsing_api_key, result_type="markdown", verbose=True)
+                        async with _llamaparse_semaphore:
+                            documents = await parser.aload_data(file_path)
+                        if documents:
+                            file_content = documents[0].text
+                            parsed = True
+                            print(f"LlamaParse success. Content length: {len(file_content)}")
+                    else:
+                         print("LLAMA_CLOUD_API_KEY missing. Fallback read.")
+                         file_content = await asyncio.to_thread(read_text_file, file_path)
+                except Exception as e:
+                    print(f"Parsing error: {e}")
+                    try:
+                        file_content = await asyncio.to_thread(read_text_file, file_path)
+                    except: file_content = ""
         
-        # Save to DB if we successfully got content
+            # Save to DB if we successfully got new content; only real parses are hashed for reuse
+            if file_content and cached_doc is None:
+                new_doc = models.Document(
+                    individual_id=individual_id,
+                    filename=file_name_for_doc,
+                    content=file_content,
+                    content_hash=file_hash if parsed else None
+                )
+                db.add(new_doc)
+                db.commit()
+                print(f"Saved new document: {file_name_for_doc}")
+
+        # 2. Handle Saved Document Usage
+        elif document_id:
+            # Only the excerpt the prompt uses is fetched, sliced in SQL
+            doc = db.query(
+                models.Document.filename,
+                func.substr(models.Document.content, 1, INDIVIDUAL_CONTEXT_CHARS).label("excerpt")
+            ).filter(
+                models.Document.id == document_id, 
+                models.Document.individual_id == individual_id
+            ).first()
+            if doc:
+                file_content = doc.excerpt
+                # Use filename as topic if not provided
+                if not topic: topic = doc.filename 
+                print(f"Using saved document: {doc.filename}")
+
+        # Validation
+        if not topic and not file_content:
+             if file_name_for_doc: topic = file_name_for_doc
+             else: topic = "Untitled Quiz"
+
+        # Document context is built once and shared by every batch's request
+        context_prompt = None
         if file_content:
-            new_doc = models.Document(
-                individual_id=individual_id,
-                filename=file_name_for_doc,
-                content=file_content
-            )
-            db.add(new_doc)
-            db.commit()
-            print(f"Saved new document: {file_name_for_doc}")
-
-    # 2. Handle Saved Document Usage
-    elif document_id:
-        doc = db.query(models.Document).filter(
-            models.Document.id == document_id, 
-            models.Document.individual_id == individual_id
-        ).first()
-        if doc:
-            file_content = doc.content
-            # Use filename as topic if not provided
-            if not topic: topic = doc.filename 
-            print(f"Using saved document: {doc.filename}")
-
-    # Validation
-    if not topic and not file_content:
-         if file_name_for_doc: topic = file_name_for_doc
-         else: topic = "Untitled Quiz"
-
-    # Create prompt with file context if available
-    context_prompt = ""
-    if file_content:
-        context_prompt = f"\n\nContext based on document:\n{file_content[:15000]}..." 
-    
-    # Generate questions (This would connect to your AI service)
-    # For now, we'll Create the quiz record
-    new_quiz = models.Quiz(
-        user_id=str(individual_id),
-        topic=topic or "Untitled Quiz",
-        quiz_format=quiz_format,
-        num_questions=num_questions,
-        difficulty=difficulty,
-        time_limit=time_limit
-    )
-    db.add(new_quiz)
-    db.commit()
-    db.refresh(new_quiz)
-    
-    # Here you would typically trigger the AI generation using the topic + context
-    # generate_quiz_questions(new_quiz.id, topic, context_prompt)
-    
-    # Mock generation for immediate feedback (replacing the previous stub)
-    # In a real app, this should be an async background task or call the AI service
+            context_prompt = f"Base your questions on the following content:\n\nContext based on document:\n{file_content[:INDIVIDUAL_CONTEXT_CHARS]}..."
+    
+        new_quiz = models.Quiz(
+            user_id=user_id,
+            topic=topic or "Untitled Quiz",
+            quiz_format=quiz_format,
+            num_questions=num_questions,
+            difficulty=difficulty,
+            time_limit=time_limit,
+            generation_status="generating"
+        )
+        db.add(new_quiz)
+        # Response built from the flushed row; committing expires it and reading it back would re-SELECT
+        db.flush()
+        quiz_response = {
+            "id": new_quiz.id,
+            "topic": new_quiz.topic,
+            "quiz_format": new_quiz.quiz_format,
+            "num_questions": new_quiz.num_questions,
+            "time_limit": new_quiz.time_limit,
+            "created_at": display_date(new_quiz.created_at),
+            "status": "generating"
+        }
+        db.commit()
     
-    # Fetch individual to get API key
-    individual = db.query(models.Individual).filter(models.Individual.id == individual_id).first()
-    if not individual or not individual.google_api_key:
-         # Log for debugging but allow "mock" generation if we wanted to support free tier without keys? 
-         # For now, require key as per requirements.
+        google_api_key = await api_key_task
+    finally:
+        # Not left running if the upload or the quiz insert raised first
+        api_key_task.cancel()
+
+    if not google_api_key:
          print("Missing Google API Key for quiz generation")
-         # raise HTTPException(status_code=400, detail="Google API Key not set.")
-         # actually, let's just proceed with a dummy key if implementation allows, or fail.
-         # Based on user request "I am failing to save the api key", they probably have one now.
-         # Let's start by getting the key.
-         pass
 
-    api_key_to_use = individual.google_api_key if individual and individual.google_api_key else "AI-dummy-key"
+    api_key_to_use = google_api_key or "AI-dummy-key"
 
-    prompt = build_quiz_prompt(topic, quiz_format, num_questions, difficulty)
+    # One prompt per batch; the batches are generated concurrently
+    batch_sizes = split_question_batches(num_questions)
+    prompts = []
+    for part, batch_size in enumerate(batch_sizes, 1):
+        prompt = build_quiz_prompt(topic, quiz_format, batch_size, difficulty)
+        if len(batch_sizes) > 1:
+            prompt += f"\n\nThis is part {part} of {len(batch_sizes)} of a larger quiz. Cover different aspects of the topic than the other parts would."
+        prompts.append(prompt)
+
+    # Questions are generated after the response is sent; the quiz can't be started until they are stored
+    background_tasks.add_task(generate_individual_questions, quiz_response["id"], prompts, api_key_to_use, quiz_format, context_prompt)
     
-    # If we have context, add it as a separate instruction in the prompt
-    if context_prompt:
-        prompt += f"\n\nBase your questions on the following content:\n{context_prompt}"
+    return quiz_response
 
-    # Only call AI if we have a key
-    questions = await generate_quiz_questions_ai(prompt, api_key_to_use)
+@app.get("/api/individual/quizzes/{quiz_id}/status")
+def get_individual_quiz_status(
+    quiz_id: int,
+    individual_id: int = Depends(individual_auth.get_current_individual_id),
+    db: Session = Depends(database.get_db)
+):
+    """Generation status of an individual quiz, polled after creation."""
+    quiz = db.query(
+        models.Quiz.id,
+        models.Quiz.generation_status,
+        models.Quiz.created_at,
+        select(func.count(models.Question.id)).where(
+            models.Question.quiz_id == models.Quiz.id
+        ).scalar_subquery().label("question_count")
+    ).filter(
+        models.Quiz.id == quiz_id,
+        models.Quiz.user_id == str(individual_id)
+    ).first()
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
     
-    # DEBUG LOGGING for User
-    if questions:
-        print(f"\n--- AI GENERATED QUESTIONS ({quiz_format}) ---")
-        print(json.dumps(questions, indent=2))
-        print("------------------------------------------\n")
+    if individual_quiz_generating(quiz.generation_status, quiz.created_at):
+        generation_status = "generating"
     else:
-        print("\n--- AI GENERATED NO QUESTIONS ---\n")
-
-    if not questions:
-        # Fallback if AI fails
-        print("AI generation returned empty, using fallback.")
-        questions = []
-    
-    for idx, q_data in enumerate(questions):
-        question = models.Question(
-            quiz_id=new_quiz.id,
-            text=q_data.get('question', 'Question text missing'),
-            options=q_data.get('options'),
-            correct_answer=q_data.get('correct_answer', ''),
-            question_type=quiz_format
-        )
-        db.add(question)
-    
-    db.commit()
-    
-    return {
-        "id": new_quiz.id,
-        "topic": new_quiz.topic,
-        "quiz_format": new_quiz.quiz_format,
-        "num_questions": new_quiz.num_questions,
-        "time_limit": new_quiz.time_limit,
-        "created_at": new_quiz.created_at.strftime("%b %d, %Y") if new_quiz.created_at else "Unknown"
-    }
+        generation_status = "ready" if quiz.question_count else "failed"
+    return {"id": quiz_id, "status": generation_status, "question_count": quiz.question_count}
 
 @app.post("/api/individual/quizzes/{quiz_id}/start")
 def start_individual_quiz(
@@ -2814,27 +3634,29 @@ def start_individual_quiz(
     db: Session = Depends(database.get_db)
 ):
     """Start a quiz attempt for an individual."""
-    quiz = db.query(models.Quiz).filter(
+    user_id = str(individual_id)
+    # Quiz and questions in one joined query
+    quiz = db.query(models.Quiz).options(
+        joinedload(models.Quiz.questions)
+    ).filter(
         models.Quiz.id == quiz_id,
-        models.Quiz.user_id == str(individual_id)
+        models.Quiz.user_id == user_id
     ).first()
     
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
-    
-    questions = db.query(models.Question).filter(
-        models.Question.quiz_id == quiz_id
-    ).all()
+    if individual_quiz_generating(quiz.generation_status, quiz.created_at):
+        raise HTTPException(status_code=409, detail="Quiz questions are still being generated")
     
     attempt = models.Attempt(
-        user_id=str(individual_id),
+        user_id=user_id,
         quiz_id=quiz_id
     )
     db.add(attempt)
-    db.commit()
-    db.refresh(attempt)
+    db.flush()  # Assigns attempt.id
     
-    return {
+    # Built before the commit expires the loaded quiz and questions
+    response = {
         "attempt_id": attempt.id,
         "quiz_topic": quiz.topic,
         "quiz_format": quiz.quiz_format,
@@ -2845,9 +3667,11 @@ def start_individual_quiz(
                 "options": q.options,
                 "question_type": q.question_type
             }
-            for q in questions
+            for q in quiz.questions
         ]
     }
+    db.commit()
+    return response
 
 @app.post("/api/individual/attempts/{attempt_id}/submit")
 async def submit_individual_attempt(
@@ -2857,18 +3681,19 @@ async def submit_individual_attempt(
     db: Session = Depends(database.get_db)
 ):
     """Submit answers for grading."""
-    attempt = db.query(models.Attempt).filter(
+    user_id = str(individual_id)
+    attempt = db.query(models.Attempt).options(
+        joinedload(models.Attempt.quiz).selectinload(models.Quiz.questions)
+    ).filter(
         models.Attempt.id == attempt_id,
-        models.Attempt.user_id == str(individual_id)
+        models.Attempt.user_id == user_id
     ).first()
     
     if not attempt:
         raise HTTPException(status_code=404, detail="Attempt not found")
     
     quiz = attempt.quiz
-    questions = db.query(models.Question).filter(
-        models.Question.quiz_id == quiz.id
-    ).all()
+    questions = quiz.questions if quiz else []
     
     # Fetch Individual for API key
     individual = db.query(models.Individual).filter(models.Individual.id == individual_id).first()
@@ -2894,17 +3719,39 @@ async def submit_individual_attempt(
         for q in questions
     ]
     
-    # Call AI Evaluation
-    ai_result = await evaluate_submission_ai(questions_data, req.answers, api_key or "AI-dummy-key")
+    # Key answers by question ID once instead of coercing IDs per lookup
+    answers_by_id = {int(k): v for k, v in req.answers.items() if k.isdigit()}
+    
+    if any(str(v).strip() for v in req.answers.values()):
+        ai_result = await evaluate_submission_ai(questions_data, req.answers, api_key or "AI-dummy-key")
+    else:
+        # Nothing was answered, so every question (objective or theory) scores zero without the model
+        ai_result = {
+            "score": f"0/{len(questions)}",
+            "results": [
+                {
+                    "id": q.id,
+                    "correct": False,
+                    "score": 0.0,
+                    "user_answer": answers_by_id.get(q.id, ""),
+                    "correct_answer": q.correct_answer,
+                    "feedback": f"No answer given. The right answer was {q.correct_answer}"
+                }
+                for q in questions
+            ]
+        }
     
     # If AI fails (empty results), fallback to basic matching for objective questions
     if not ai_result.get("results"):
         print("AI Evaluation failed or returned empty. Using fallback grading.")
+        norm_answers = {qid: normalize_answer(v) for qid, v in answers_by_id.items()}
         correct_count = 0
         feedback_list = []
         for q in questions:
-            ua = req.answers.get(str(q.id), "")
-            is_correct = ua.strip().lower() == (q.correct_answer or "").strip().lower()
+            ua = answers_by_id.get(q.id, "")
+            correct_norm = q.correct_answer_norm if q.correct_answer_norm is not None else normalize_answer(q.correct_answer)
+            # A question without a stored answer can't be matched (a blank answer would equal it)
+            is_correct = correct_norm != "" and norm_answers.get(q.id, "") == correct_norm
             if is_correct: correct_count += 1
             feedback_list.append({
                 "id": q.id,
@@ -2925,10 +3772,11 @@ async def submit_individual_attempt(
     
     # Ensure user_answer and correct_answer are present in feedback items
     # We correlate by ID first, then by index as a fallback (AI often re-indexes to 1,2,3...)
+    questions_by_id = {str(q.id): q for q in questions}
     for idx, item in enumerate(final_feedback):
         q_id = str(item.get("id"))
         # Match by ID
-        q_match = next((q for q in questions if str(q.id) == q_id), None)
+        q_match = questions_by_id.get(q_id)
         
         # Fallback to index-based match if AI re-indexed questions to 1,2,3...
         if not q_match and idx < len(questions):
@@ -2936,7 +3784,7 @@ async def submit_individual_attempt(
             
         if q_match:
             if "user_answer" not in item:
-                item["user_answer"] = req.answers.get(str(q_match.id), "")
+                item["user_answer"] = answers_by_id.get(q_match.id, "")
             if "correct_answer" not in item:
                 item["correct_answer"] = q_match.correct_answer
             # Sync ID to database ID for reliable frontend lookup
@@ -2946,17 +3794,9 @@ async def submit_individual_attempt(
     attempt.feedback = final_feedback
     attempt.timestamp = datetime.datetime.utcnow()
     
+    score_percentage = score_percentage_value(attempt.score) or 0.0
+    attempt.score_percentage = score_percentage
     db.commit()
-    
-    # Parse score for percentage
-    try:
-        if "/" in attempt.score:
-            num, den = map(float, attempt.score.split('/'))
-            score_percentage = round((num / den) * 100, 1) if den > 0 else 0
-        else:
-             score_percentage = 0
-    except:
-        score_percentage = 0
 
     return {
         "score": f"{score_percentage}%",
@@ -2971,20 +3811,33 @@ def get_individual_attempts(
     db: Session = Depends(database.get_db)
 ):
     """Get all quiz attempts for individual."""
-    attempts = db.query(models.Attempt).filter(
-        models.Attempt.user_id == str(individual_id),
+    user_id = str(individual_id)
+    # Column-only rows (quiz fields via outer join) streamed in batches
+    attempts = db.query(models.Attempt).with_entities(
+        models.Attempt.id,
+        models.Attempt.score,
+        models.Attempt.score_percentage,
+        models.Attempt.timestamp,
+        models.Quiz.id.label("quiz_id"),
+        models.Quiz.topic,
+        models.Quiz.quiz_format,
+        models.Quiz.num_questions
+    ).outerjoin(
+        models.Quiz, models.Attempt.quiz_id == models.Quiz.id
+    ).filter(
+        models.Attempt.user_id == user_id,
         models.Attempt.score.isnot(None)
-    ).order_by(models.Attempt.timestamp.desc()).all()
+    ).order_by(models.Attempt.timestamp.desc()).yield_per(500)
     
     return [
         {
             "id": a.id,
-            "quiz_topic": a.quiz.topic if a.quiz else "Unknown",
-            "quiz_format": a.quiz.quiz_format if a.quiz else "Unknown",
-            "num_questions": a.quiz.num_questions if a.quiz else 0,
-            "score": f"{round((float(a.score.split('/')[0])/float(a.score.split('/')[1])*100), 1) if '/' in a.score and float(a.score.split('/')[1])>0 else 0}%",
+            "quiz_topic": a.topic if a.quiz_id is not None else "Unknown",
+            "quiz_format": a.quiz_format if a.quiz_id is not None else "Unknown",
+            "num_questions": a.num_questions if a.quiz_id is not None else 0,
+            "score": percentage_label(a.score_percentage, a.score),
             "mark": a.score,
-            "timestamp": a.timestamp.strftime("%b %d, %Y") if a.timestamp else "Unknown"
+            "timestamp": display_date(a.timestamp)
         }
         for a in attempts
     ]
@@ -2995,15 +3848,18 @@ def get_individual_documents(
     db: Session = Depends(database.get_db)
 ):
     """Get all documents uploaded by individual."""
-    docs = db.query(models.Document).filter(
-        models.Document.individual_id == individual_id
-    ).order_by(models.Document.created_at.desc()).all()
+    # Only the listed columns; the parsed content can be large
+    docs = db.execute(
+        select(models.Document.id, models.Document.filename, models.Document.created_at).where(
+            models.Document.individual_id == individual_id
+        ).order_by(models.Document.created_at.desc())
+    ).all()
     
     return [
         {
             "id": doc.id,
             "filename": doc.filename,
-            "created_at": doc.created_at.strftime("%b %d, %Y") if doc.created_at else "Unknown"
+            "created_at": display_date(doc.created_at)
         }
         for doc in docs
     ]
@@ -3015,25 +3871,32 @@ def get_individual_attempt_details(
     db: Session = Depends(database.get_db)
 ):
     """Get detailed results for a specific attempt."""
-    attempt = db.query(models.Attempt).filter(
+    user_id = str(individual_id)
+    # feedback comes back as its stored JSON text and is embedded in the response as-is
+    row = db.query(
+        models.Attempt,
+        cast(models.Attempt.feedback, String).label("feedback_json")
+    ).options(
+        defer(models.Attempt.feedback),
+        joinedload(models.Attempt.quiz).selectinload(models.Quiz.questions)
+    ).filter(
         models.Attempt.id == attempt_id,
-        models.Attempt.user_id == str(individual_id)
+        models.Attempt.user_id == user_id
     ).first()
     
-    if not attempt:
+    if not row:
         raise HTTPException(status_code=404, detail="Attempt not found")
+    attempt = row.Attempt
     
-    questions = db.query(models.Question).filter(
-        models.Question.quiz_id == attempt.quiz_id
-    ).all()
+    questions = attempt.quiz.questions if attempt.quiz else []
     
-    return {
+    return ORJSONResponse({
         "id": attempt.id,
         "quiz_topic": attempt.quiz.topic if attempt.quiz else "Unknown",
-        "score": f"{round((float(attempt.score.split('/')[0])/float(attempt.score.split('/')[1])*100), 1) if '/' in attempt.score and float(attempt.score.split('/')[1])>0 else 0}%",
+        "score": percentage_label(attempt.score_percentage, attempt.score),
         "mark": attempt.score,
         "timestamp": attempt.timestamp.strftime("%b %d, %Y %H:%M") if attempt.timestamp else "Unknown",
-        "feedback": attempt.feedback,
+        "feedback": orjson.Fragment(row.feedback_json) if row.feedback_json is not None else None,
         "questions": [
             {
                 "id": q.id,
@@ -3043,4 +3906,4 @@ def get_individual_attempt_details(
             }
             for q in questions
         ]
-     }
+    })
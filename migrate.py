@@ -0,0 +1,144 @@
+"""
+Idempotent schema migration runner for the configured database (SQLite locally,
+PostgreSQL when DATABASE_URL is set). Creates missing tables, then adds only the
+columns, indexes and backfills an older database lacks, inside a single transaction.
+Runs on application startup and can also be invoked directly.
+"""
+
+import sys
+
+from sqlalchemy import inspect
+from sqlalchemy.exc import SQLAlchemyError
+
+import database
+import models
+
+# (table, column, type, default)
+MIGRATIONS = [
+    ("students", "password", "TEXT", None),
+    ("students", "openrouter_api_key", "TEXT", None),
+    ("quizzes", "difficulty", "VARCHAR", "'medium'"),
+    ("questions", "question_type", "VARCHAR", "'multiple_choice'"),
+    ("documents", "individual_id", "INTEGER", None),
+    ("attempts", "score_percentage", "FLOAT", None),
+    ("questions", "correct_answer_norm", "VARCHAR", None),
+    ("documents", "content_hash", "VARCHAR", None),
+    ("student_attempts", "score_percentage", "FLOAT", None),
+    ("users", "google_api_key", "TEXT", None),
+    ("individuals", "google_api_key", "TEXT", None),
+    ("students", "google_api_key", "TEXT", None),
+    ("student_attempts", "questions", "JSON", None),
+    ("student_attempts", "correct_answers_norm", "JSON", None),
+    ("quizzes", "generation_status", "VARCHAR", None),
+]
+
+# Indexes on migrated columns and composite indexes (create_all only indexes tables it creates)
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_documents_content_hash ON documents (content_hash)",
+    "CREATE INDEX IF NOT EXISTS ix_quizzes_user_created ON quizzes (user_id, created_at DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_documents_individual_created ON documents (individual_id, created_at DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_attempts_user_timestamp ON attempts (user_id, timestamp DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_school_quizzes_classroom_created ON school_quizzes (classroom_id, created_at DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_student_attempts_student_completed ON student_attempts (student_id, completed_at DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_student_attempts_student_quiz ON student_attempts (student_id, school_quiz_id)",
+]
+
+# score_percentage from legacy "X/Y" score strings, per dialect
+SCORE_PERCENTAGE_BACKFILL = {
+    "sqlite": """
+        UPDATE {table}
+        SET score_percentage = ROUND(
+            100.0 * CAST(substr(score, 1, instr(score, '/') - 1) AS REAL)
+            / CAST(substr(score, instr(score, '/') + 1) AS REAL), 1)
+        WHERE score_percentage IS NULL
+          AND instr(score, '/') > 0
+          AND CAST(substr(score, instr(score, '/') + 1) AS REAL) > 0
+    """,
+    "postgresql": """
+        UPDATE {table}
+        SET score_percentage = ROUND(
+            100.0 * split_part(score, '/', 1)::numeric
+            / split_part(score, '/', 2)::numeric, 1)
+        WHERE score_percentage IS NULL
+          -- Fractional theory scores ("2.5/5") included; CASE keeps the cast behind the match
+          AND CASE WHEN score ~ '^[0-9]+(\\.[0-9]+)?/[0-9]+(\\.[0-9]+)?$'
+                   THEN split_part(score, '/', 2)::numeric > 0
+                   ELSE false END
+    """,
+}
+
+# Data fixes run after the columns exist; each must be safe to re-run
+BACKFILL_TABLES = ["attempts", "student_attempts"]
+
+# Serializes concurrent migrations from several PostgreSQL workers (arbitrary app-wide key)
+PG_MIGRATION_LOCK_KEY = 7460211
+
+def add_column_sql(dialect: str, table: str, column: str, col_type: str, default) -> str:
+    # SQLite has no ADD COLUMN IF NOT EXISTS; there the inspector check is enough
+    if_not_exists = "IF NOT EXISTS " if dialect == "postgresql" else ""
+    statement = f'ALTER TABLE "{table}" ADD COLUMN {if_not_exists}"{column}" {col_type}'
+    if default is not None:
+        statement += f" DEFAULT {default}"
+    return statement
+
+def migrate(engine=database.engine):
+    """Create missing tables and add any missing columns and indexes in one transaction."""
+    dialect = engine.dialect.name
+    # Autocommit at the driver so the transaction below is controlled explicitly (DDL included)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        try:
+            if dialect == "sqlite":
+                # IMMEDIATE takes the write lock once, up front
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+            else:
+                conn.exec_driver_sql("BEGIN")
+                if dialect == "postgresql":
+                    conn.exec_driver_sql(f"SELECT pg_advisory_xact_lock({PG_MIGRATION_LOCK_KEY})")
+
+            models.Base.metadata.create_all(bind=conn)
+
+            inspector = inspect(conn)
+            tables = set(inspector.get_table_names())
+            existing = {}
+            for table in {m[0] for m in MIGRATIONS} & tables:
+                existing[table] = {col["name"] for col in inspector.get_columns(table)}
+
+            applied = 0
+            for table, column, col_type, default in MIGRATIONS:
+                if table not in existing or column in existing[table]:
+                    continue
+                print(f"Adding {column} to {table}...")
+                conn.exec_driver_sql(add_column_sql(dialect, table, column, col_type, default))
+                existing[table].add(column)
+                applied += 1
+
+            for statement in INDEXES:
+                conn.exec_driver_sql(statement)
+
+            backfill = SCORE_PERCENTAGE_BACKFILL.get(dialect)
+            if backfill:
+                for table in BACKFILL_TABLES:
+                    conn.exec_driver_sql(backfill.format(table=table))
+
+            conn.exec_driver_sql("COMMIT")
+            print(f"Migration finished: {applied} column(s) added.")
+        except SQLAlchemyError as e:
+            conn.exec_driver_sql("ROLLBACK")
+            print(f"Migration failed, rolled back: {e}")
+            raise
+
+def check_schema(table: str = "documents", engine=database.engine):
+    """Print the columns of a table."""
+    try:
+        columns = inspect(engine).get_columns(table)
+        print(f"Columns in '{table}' table:")
+        for col in columns:
+            print((col["name"], str(col["type"]), col["nullable"], col.get("default")))
+    except Exception as e:
+        print(f"Error: {e}")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "check":
+        check_schema(*sys.argv[2:3])
+    else:
+        migrate()
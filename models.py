@@ -1,7 +1,12 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, JSON, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, JSON, DateTime, Float, Index
 from sqlalchemy.orm import relationship
 from database import Base
 import datetime
+import os
+
+# Set SQLALCHEMY_RAISE_ON_LAZY=1 (e.g. in tests) to make any unplanned lazy load raise,
+# so endpoints that forget to eager-load a relationship fail loudly instead of issuing N+1 queries.
+RELATIONSHIP_LAZY = "raise_on_sql" if os.getenv("SQLALCHEMY_RAISE_ON_LAZY") else "select"
 
 class User(Base):
     __tablename__ = "users"
@@ -10,9 +15,9 @@ class User(Base):
     openrouter_api_key = Column(String, nullable=True)
     google_api_key = Column(String, nullable=True)
     
-    quizzes = relationship("Quiz", back_populates="user")
-    attempts = relationship("Attempt", back_populates="user")
-    documents = relationship("Document", back_populates="user")
+    quizzes = relationship("Quiz", back_populates="user", lazy=RELATIONSHIP_LAZY)
+    attempts = relationship("Attempt", back_populates="user", lazy=RELATIONSHIP_LAZY)
+    documents = relationship("Document", back_populates="user", lazy=RELATIONSHIP_LAZY)
 
 class Quiz(Base):
     __tablename__ = "quizzes"
@@ -25,10 +30,15 @@ class Quiz(Base):
     time_limit = Column(Integer, default=30) # Time limit in minutes
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     user_id = Column(String, ForeignKey("users.id"))
+    generation_status = Column(String, nullable=True) # 'generating', 'ready', 'failed' for background-generated individual quizzes
+
+    user = relationship("User", back_populates="quizzes", lazy=RELATIONSHIP_LAZY)
+    questions = relationship("Question", back_populates="quiz", lazy=RELATIONSHIP_LAZY)
+    attempts = relationship("Attempt", back_populates="quiz", lazy=RELATIONSHIP_LAZY)
 
-    user = relationship("User", back_populates="quizzes")
-    questions = relationship("Question", back_populates="quiz")
-    attempts = relationship("Attempt", back_populates="quiz")
+    __table_args__ = (
+        Index("ix_quizzes_user_created", user_id, created_at.desc()),
+    )
 
 class Question(Base):
     __tablename__ = "questions"
@@ -38,9 +48,10 @@ class Question(Base):
     text = Column(String)
     options = Column(JSON) # Store list of options as JSON
     correct_answer = Column(String, nullable=True) # AI will evaluate, so this might be empty/unused initially
+    correct_answer_norm = Column(String, nullable=True) # Normalized correct_answer, precomputed for grading
     question_type = Column(String, default="multiple_choice")
 
-    quiz = relationship("Quiz", back_populates="questions")
+    quiz = relationship("Quiz", back_populates="questions", lazy=RELATIONSHIP_LAZY)
 
 class Attempt(Base):
     __tablename__ = "attempts"
@@ -49,11 +60,16 @@ class Attempt(Base):
     quiz_id = Column(Integer, ForeignKey("quizzes.id"))
     user_id = Column(String, ForeignKey("users.id"))
     score = Column(String) # Changed to String to support "X/Y" format or similar if needed, or keep Integer. User asked for "score": "x/y".
+    score_percentage = Column(Float, nullable=True) # Parsed from score on write so averages can be computed in SQL
     feedback = Column(JSON) # Store detailed feedback from AI
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
 
-    quiz = relationship("Quiz", back_populates="attempts")
-    user = relationship("User", back_populates="attempts")
+    quiz = relationship("Quiz", back_populates="attempts", lazy=RELATIONSHIP_LAZY)
+    user = relationship("User", back_populates="attempts", lazy=RELATIONSHIP_LAZY)
+
+    __table_args__ = (
+        Index("ix_attempts_user_timestamp", user_id, timestamp.desc()),
+    )
 
 class Document(Base):
     __tablename__ = "documents"
@@ -63,10 +79,15 @@ class Document(Base):
     individual_id = Column(Integer, ForeignKey("individuals.id"), nullable=True) # Added for Individual Portal
     filename = Column(String)
     content = Column(String) # Storing markdown content
+    content_hash = Column(String, index=True, nullable=True) # SHA-256 of the uploaded file, reuses earlier parses
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
-    user = relationship("User", back_populates="documents")
-    individual = relationship("Individual") # Simple relationship
+    user = relationship("User", back_populates="documents", lazy=RELATIONSHIP_LAZY)
+    individual = relationship("Individual", lazy=RELATIONSHIP_LAZY) # Simple relationship
+
+    __table_args__ = (
+        Index("ix_documents_individual_created", individual_id, created_at.desc()),
+    )
 
 # --- School Quiz Management Models ---
 
@@ -81,9 +102,9 @@ class School(Base):
     education_system = Column(JSON) # Store education levels as JSON array
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
-    classrooms = relationship("Classroom", back_populates="school", cascade="all, delete-orphan")
-    students = relationship("Student", back_populates="school", cascade="all, delete-orphan")
-    school_quizzes = relationship("SchoolQuiz", back_populates="school", cascade="all, delete-orphan")
+    classrooms = relationship("Classroom", back_populates="school", cascade="all, delete-orphan", lazy=RELATIONSHIP_LAZY)
+    students = relationship("Student", back_populates="school", cascade="all, delete-orphan", lazy=RELATIONSHIP_LAZY)
+    school_quizzes = relationship("SchoolQuiz", back_populates="school", cascade="all, delete-orphan", lazy=RELATIONSHIP_LAZY)
 
 class Individual(Base):
     __tablename__ = "individuals"
@@ -105,9 +126,9 @@ class Classroom(Base):
     grade_level = Column(String, nullable=False) # e.g., "Primary 3"
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
-    school = relationship("School", back_populates="classrooms")
-    students = relationship("Student", back_populates="classroom", cascade="all, delete-orphan")
-    school_quizzes = relationship("SchoolQuiz", back_populates="classroom", cascade="all, delete-orphan")
+    school = relationship("School", back_populates="classrooms", lazy=RELATIONSHIP_LAZY)
+    students = relationship("Student", back_populates="classroom", cascade="all, delete-orphan", lazy=RELATIONSHIP_LAZY)
+    school_quizzes = relationship("SchoolQuiz", back_populates="classroom", cascade="all, delete-orphan", order_by="SchoolQuiz.id", lazy=RELATIONSHIP_LAZY)
 
 class Student(Base):
     __tablename__ = "students"
@@ -124,9 +145,9 @@ class Student(Base):
     google_api_key = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
-    school = relationship("School", back_populates="students")
-    classroom = relationship("Classroom", back_populates="students")
-    student_attempts = relationship("StudentAttempt", back_populates="student", cascade="all, delete-orphan")
+    school = relationship("School", back_populates="students", lazy=RELATIONSHIP_LAZY)
+    classroom = relationship("Classroom", back_populates="students", lazy=RELATIONSHIP_LAZY)
+    student_attempts = relationship("StudentAttempt", back_populates="student", cascade="all, delete-orphan", order_by="StudentAttempt.id", lazy=RELATIONSHIP_LAZY)
 
 class SchoolQuiz(Base):
     __tablename__ = "school_quizzes"
@@ -146,10 +167,14 @@ class SchoolQuiz(Base):
     created_by = Column(String, nullable=True) # IT personnel name/identifier
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
-    school = relationship("School", back_populates="school_quizzes")
-    classroom = relationship("Classroom", back_populates="school_quizzes")
-    document = relationship("Document")
-    student_attempts = relationship("StudentAttempt", back_populates="school_quiz", cascade="all, delete-orphan")
+    school = relationship("School", back_populates="school_quizzes", lazy=RELATIONSHIP_LAZY)
+    classroom = relationship("Classroom", back_populates="school_quizzes", lazy=RELATIONSHIP_LAZY)
+    document = relationship("Document", lazy=RELATIONSHIP_LAZY)
+    student_attempts = relationship("StudentAttempt", back_populates="school_quiz", cascade="all, delete-orphan", lazy=RELATIONSHIP_LAZY)
+
+    __table_args__ = (
+        Index("ix_school_quizzes_classroom_created", classroom_id, created_at.desc()),
+    )
 
 class StudentAttempt(Base):
     __tablename__ = "student_attempts"
@@ -158,10 +183,18 @@ class StudentAttempt(Base):
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
     school_quiz_id = Column(Integer, ForeignKey("school_quizzes.id"), nullable=False)
     score = Column(String, nullable=True) # Format: "X/Y" (Null if not submitted)
+    score_percentage = Column(Float, nullable=True) # Parsed from score on submit
     answers = Column(JSON, nullable=True) # Store student answers (Null initially)
     questions = Column(JSON, nullable=False) # Store generated questions for this attempt
+    correct_answers_norm = Column(JSON, nullable=True) # {question id: normalized correct answer}, kept out of the served questions
     feedback = Column(JSON, nullable=True) # Store AI feedback
     completed_at = Column(DateTime, nullable=True)
 
-    student = relationship("Student", back_populates="student_attempts")
-    school_quiz = relationship("SchoolQuiz", back_populates="student_attempts")
+    student = relationship("Student", back_populates="student_attempts", lazy=RELATIONSHIP_LAZY)
+    school_quiz = relationship("SchoolQuiz", back_populates="student_attempts", lazy=RELATIONSHIP_LAZY)
+
+    # Per-student history ordered by completion, and the per-quiz attempt lookups
+    __table_args__ = (
+        Index("ix_student_attempts_student_completed", student_id, completed_at.desc()),
+        Index("ix_student_attempts_student_quiz", student_id, school_quiz_id),
+    )
@@ -4,14 +4,29 @@ Handles password hashing, JWT token generation, and verification.
 """
 
 import os
+import logging
+import time
+import functools
+import threading
 import jwt
 import bcrypt
+from cachetools import TTLCache
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError, InvalidHashError
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
 from datetime import datetime, timedelta
 from fastapi import HTTPException, Security, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from dotenv import load_dotenv
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+# database loads .env on import, so it comes before the settings below are read
+import database
+import models
 
-load_dotenv()
+# Per-request auth tracing; enable with logging level DEBUG for this module
+logger = logging.getLogger(__name__)
 
 # Security schemes
 school_security = HTTPBearer()
@@ -19,18 +34,53 @@ student_security = HTTPBearer()
 
 # JWT Configuration
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
+# Encoded once rather than by PyJWT on every encode/decode
+_SECRET_KEY_BYTES = SECRET_KEY.encode("utf-8")
 ALGORITHM = "HS256"
+MAX_TOKEN_LENGTH = 8192
 ACCESS_TOKEN_EXPIRE_HOURS = 24
+# Tokens issued before the "aud" claim was added only carry "type". They are still accepted
+# (type checked instead) so the rollout doesn't log everyone out; set this to False once
+# ACCESS_TOKEN_EXPIRE_HOURS have passed since then, when no such token can still be valid.
+ACCEPT_PRE_AUDIENCE_TOKENS = True
+
+# Same Argon2id parameters as individual accounts (roughly 50ms per hash)
+password_hasher = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+
+# Seed scripts only: test accounts don't need the full work factor. needs_rehash() flags
+# these hashes, so a seeded account is upgraded to password_hasher on its first login.
+SEED_HASH_MEMORY_KIB = int(os.getenv("SEED_HASH_MEMORY_KIB", "1024"))
+seed_password_hasher = PasswordHasher(time_cost=1, memory_cost=SEED_HASH_MEMORY_KIB, parallelism=1)
+
+def hash_password(password: str, hasher: PasswordHasher = password_hasher) -> str:
+    """Hash a password using Argon2id."""
+    return hasher.hash(password)
 
-def hash_password(password: str) -> str:
-    """Hash a password using bcrypt."""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
+# bcrypt and argon2 release the GIL while hashing, so a thread per core hashes in parallel
+password_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="password")
+
+# Argon2 hash of a random throwaway password; checked when the account doesn't exist
+# so unknown and known logins take the same time
+DUMMY_PASSWORD_HASH = "$argon2id$v=19$m=19456,t=2,p=1$VhIzlOnAwER0sfdqqg/6/g$gGayTdpLYlIV2Wy2D7wUnPftpkbbiyPEl4TlpjqIxEE"
+
+def hash_passwords(passwords: List[str], hasher: PasswordHasher = password_hasher) -> List[str]:
+    """Hash several passwords concurrently; results keep the input order."""
+    return list(password_pool.map(hasher.hash, passwords))
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash."""
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    """Verify a password against its hash (Argon2id, or bcrypt for accounts created before the switch)."""
+    if hashed_password.startswith("$2"):
+        return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    try:
+        return password_hasher.verify(hashed_password, plain_password)
+    except (VerifyMismatchError, InvalidHashError):
+        return False
+
+def needs_rehash(hashed_password: str) -> bool:
+    """Whether a stored hash is bcrypt or uses outdated Argon2 parameters."""
+    if hashed_password.startswith("$2"):
+        return True
+    return password_hasher.check_needs_rehash(hashed_password)
 
 def create_access_token(data: dict, token_type: str = "school") -> str:
     """
@@ -42,20 +92,47 @@ def create_access_token(data: dict, token_type: str = "school") -> str:
     """
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
+    # The type doubles as the audience so decode_token can check it during verification
     to_encode.update({
         "exp": expire,
-        "type": token_type
+        "type": token_type,
+        "aud": token_type
     })
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, _SECRET_KEY_BYTES, algorithm=ALGORITHM)
     return encoded_jwt
 
+@functools.lru_cache(maxsize=4096)
+def _decode(token: str, audience: str = None) -> dict:
+    """Verify a token's signature, claims and audience once; repeat requests with the same token hit the cache."""
+    try:
+        return jwt.decode(
+            token,
+            _SECRET_KEY_BYTES,
+            algorithms=[ALGORITHM],
+            audience=audience,
+            options={"require": ["exp", "sub", "aud"], "verify_aud": audience is not None}
+        )
+    except jwt.MissingRequiredClaimError as e:
+        if e.claim != "aud" or not ACCEPT_PRE_AUDIENCE_TOKENS:
+            raise
+    # Pre-audience token: everything else is still verified, and the legacy type claim stands in for aud
+    payload = jwt.decode(
+        token,
+        _SECRET_KEY_BYTES,
+        algorithms=[ALGORITHM],
+        options={"require": ["exp", "sub"], "verify_aud": False}
+    )
+    if audience is not None and payload.get("type") != audience:
+        raise jwt.InvalidAudienceError("Token type doesn't match")
+    return payload
+
 def decode_token(token: str, expected_type: str = None) -> dict:
     """
     Decode and verify a JWT token.
     
     Args:
         token: JWT token string
-        expected_type: Expected token type ('school' or 'student')
+        expected_type: Expected token type ('school' or 'student'), checked as the audience
     
     Returns:
         Decoded token payload
@@ -64,29 +141,41 @@ def decode_token(token: str, expected_type: str = None) -> dict:
         HTTPException: If token is invalid or expired
     """
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        # Junk is rejected before any decoding (failed decodes aren't memoized)
+        if len(token) > MAX_TOKEN_LENGTH or token.count(".") != 2:
+            raise jwt.DecodeError("Malformed token")
+        payload = _decode(token, expected_type)
         
-        # Verify token type if specified
-        if expected_type and payload.get("type") != expected_type:
-            raise HTTPException(
-                status_code=401, 
-                detail=f"Invalid token type. Expected {expected_type}"
-            )
+        # Cached payloads were verified when first seen, so only expiry needs re-checking
+        if payload["exp"] < time.time():
+            raise jwt.ExpiredSignatureError("Signature has expired")
         
         return payload
     except jwt.ExpiredSignatureError:
-        print("DEBUG AUTH: Token has expired", flush=True)
+        logger.debug("Token has expired")
         raise HTTPException(status_code=401, detail="Token has expired")
     except jwt.InvalidTokenError as e:
-        print(f"DEBUG AUTH: Invalid token error: {e}", flush=True)
+        logger.debug("Invalid token error: %s", e)
         raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
     except Exception as e:
-        print(f"DEBUG AUTH: Unexpected error during decode: {e}", flush=True)
+        logger.debug("Unexpected error during decode: %s", e)
         raise HTTPException(status_code=401, detail="Authentication error during decoding")
 
-from sqlalchemy.orm import Session
-import database
-import models
+# IDs of schools and students recently confirmed to exist. A stale entry only lasts 60s,
+# and deletes evict immediately through the after_delete hooks below.
+_existing_schools = TTLCache(maxsize=10_000, ttl=60)
+_existing_students = TTLCache(maxsize=50_000, ttl=60)
+_existing_accounts_lock = threading.Lock()
+
+@event.listens_for(models.School, "after_delete")
+def _forget_deleted_school(mapper, connection, target):
+    with _existing_accounts_lock:
+        _existing_schools.pop(target.id, None)
+
+@event.listens_for(models.Student, "after_delete")
+def _forget_deleted_student(mapper, connection, target):
+    with _existing_accounts_lock:
+        _existing_students.pop(target.id, None)
 
 def get_current_school_id(
     credentials: HTTPAuthorizationCredentials = Security(school_security),
@@ -97,62 +186,98 @@ def get_current_school_id(
     Verifies that the school still exists in the database.
     """
     token = credentials.credentials
-    print(f"DEBUG AUTH: Received school token: {token[:10]}...", flush=True)
+    logger.debug("Received school token: %s...", token[:10])
     try:
         payload = decode_token(token, expected_type="school")
     except HTTPException as e:
-        print(f"DEBUG AUTH: decoding failed: {e.detail}", flush=True)
+        logger.debug("decoding failed: %s", e.detail)
         raise e
         
     school_id = payload.get("sub")
     
-    print(f"DEBUG AUTH: Decoded school_id from token: {school_id} (type: {type(school_id)})", flush=True)
+    logger.debug("Decoded school_id from token: %s (type: %s)", school_id, type(school_id))
     
     if not school_id:
         raise HTTPException(status_code=401, detail="Invalid token payload: missing sub")
         
-    # Verify school exists in DB - Explicitly cast to int
     try:
         sid_int = int(school_id)
-        school = db.query(models.School).filter(models.School.id == sid_int).first()
     except (ValueError, TypeError):
-        print(f"DEBUG AUTH: school_id {school_id} could not be cast to int", flush=True)
+        logger.debug("school_id %s could not be cast to int", school_id)
         raise HTTPException(status_code=401, detail="Invalid school ID format in token")
 
+    with _existing_accounts_lock:
+        if sid_int in _existing_schools:
+            return sid_int
+
+    # Verify school exists in DB
+    school = db.query(models.School.id).filter(models.School.id == sid_int).first()
     if not school:
-        print(f"DEBUG AUTH: School with ID {school_id} not found in database", flush=True)
+        logger.debug("School with ID %s not found in database", school_id)
         raise HTTPException(status_code=401, detail=f"School account {school_id} not found in DB")
     
+    with _existing_accounts_lock:
+        _existing_schools[sid_int] = True
     return sid_int
 
-def get_current_student_id(
-    credentials: HTTPAuthorizationCredentials = Security(student_security),
-    db: Session = Depends(database.get_db)
-) -> int:
-    """
-    Dependency to get the current authenticated student ID.
-    Verifies that the student still exists in the database.
-    """
-    token = credentials.credentials
-    print(f"DEBUG AUTH: Received student token: {token[:10]}...")
+def _student_id_from_token(token: str) -> int:
+    """Student ID from a verified student token."""
+    logger.debug("Received student token: %s...", token[:10])
     payload = decode_token(token, expected_type="student")
     student_id = payload.get("sub")
     
-    print(f"DEBUG AUTH: Decoded student_id from token: {student_id} (type: {type(student_id)})")
+    logger.debug("Decoded student_id from token: %s (type: %s)", student_id, type(student_id))
     
     if not student_id:
         raise HTTPException(status_code=401, detail="Invalid token payload")
         
-    # Verify student exists in DB
     try:
-        sid_int = int(student_id)
-        student = db.query(models.Student).filter(models.Student.id == sid_int).first()
+        return int(student_id)
     except (ValueError, TypeError):
-        print(f"DEBUG AUTH: student_id {student_id} could not be cast to int")
+        logger.debug("student_id %s could not be cast to int", student_id)
         raise HTTPException(status_code=401, detail="Invalid student ID format")
 
+async def get_current_student(
+    credentials: HTTPAuthorizationCredentials = Security(student_security),
+    db: AsyncSession = Depends(database.get_async_db)
+) -> models.Student:
+    """
+    Dependency to get the current authenticated student row, for endpoints that
+    need the student's columns. FastAPI caches it per request.
+    """
+    sid_int = _student_id_from_token(credentials.credentials)
+
+    # Verify student exists in DB
+    student = await db.get(models.Student, sid_int)
+    if not student:
+        logger.debug("Student with ID %s not found in database", sid_int)
+        raise HTTPException(status_code=401, detail="Student account not found")
+    
+    with _existing_accounts_lock:
+        _existing_students[sid_int] = True
+    return student
+
+async def get_current_student_id(
+    credentials: HTTPAuthorizationCredentials = Security(student_security),
+    db: AsyncSession = Depends(database.get_async_db)
+) -> int:
+    """
+    Dependency to get the current authenticated student ID.
+    Verifies that the student still exists in the database.
+    """
+    sid_int = _student_id_from_token(credentials.credentials)
+
+    with _existing_accounts_lock:
+        if sid_int in _existing_students:
+            return sid_int
+
+    student = (await db.execute(
+        select(models.Student.id).where(models.Student.id == sid_int)
+    )).first()
     if not student:
-        print(f"DEBUG AUTH: Student with ID {student_id} not found in database")
+        logger.debug("Student with ID %s not found in database", sid_int)
         raise HTTPException(status_code=401, detail="Student account not found")
     
+    with _existing_accounts_lock:
+        _existing_students[sid_int] = True
     return sid_int
@@ -79,7 +79,7 @@ def seed_database():
             school = db.query(models.School).filter(models.School.email == school_data["email"]).first()
             if not school:
                 print(f"\n✓ Creating School: {school_data['name']}")
-                password_hash = school_auth.hash_password(school_data["password"])
+                password_hash = school_auth.hash_password(school_data["password"], school_auth.seed_password_hasher)
                 levels = get_education_levels(school_data["country"])
                 school = models.School(
                     name=school_data["name"],
@@ -89,12 +89,19 @@ def seed_database():
                     education_system=levels
                 )
                 db.add(school)
-                db.commit()
-                db.refresh(school)
+                db.flush()
                 print(f"  -> Created with ID: {school.id}")
             else:
                 print(f"\n→ School {school_data['name']} already exists (ID: {school.id})")
 
+            # Student ID state is read once per school; IDs are then generated locally
+            year = datetime.now().year
+            next_seq = db.query(models.Student).filter(models.Student.school_id == school.id).count() + 1
+            taken_ids = {sid for (sid,) in db.query(models.Student.student_id).filter(
+                models.Student.student_id.like(f"STU-{year}-{school.id:03d}-%")
+            )}
+            students_to_add = []
+
             # Classrooms
             levels = get_education_levels(school.country)
             classroom_names = [levels[0], levels[1]] if len(levels) > 1 else ["Class A", "Class B"]
@@ -114,8 +121,7 @@ def seed_database():
                         grade_level=class_name_base
                     )
                     db.add(classroom)
-                    db.commit()
-                    db.refresh(classroom)
+                    db.flush()
                 else:
                     print(f"  → Classroom {class_name} already exists (ID: {classroom.id})")
                 
@@ -128,12 +134,12 @@ def seed_database():
                         student_uuid = f"{school.id}_{classroom.id}_{i}"
                         student_email = f"student_{student_uuid}@quigo.test"
                         
-                        total_in_school = db.query(models.Student).filter(models.Student.school_id == school.id).count()
-                        student_id = credential_generator.generate_student_id(school.id, total_in_school + 1)
-                        
-                        while db.query(models.Student).filter(models.Student.student_id == student_id).first():
-                            total_in_school += 1
-                            student_id = credential_generator.generate_student_id(school.id, total_in_school + 1)
+                        student_id = credential_generator.generate_student_id(school.id, next_seq, year)
+                        while student_id in taken_ids:
+                            next_seq += 1
+                            student_id = credential_generator.generate_student_id(school.id, next_seq, year)
+                        taken_ids.add(student_id)
+                        next_seq += 1
 
                         print(f"      → {student_id} ({student_email})")
                         
@@ -144,15 +150,22 @@ def seed_database():
                             name=f"Student {i} - {class_name}",
                             email=student_email,
                             student_id=student_id,
-                            password_hash=school_auth.hash_password(plain_password),
                             password=plain_password
                         )
-                        db.add(student)
-                        db.commit()
+                        students_to_add.append(student)
                     print(f"    ✓ Finished adding students")
                 else:
                     print(f"    → Classroom {class_name} already has {current_students_count} students")
 
+            # All of the school's passwords are hashed together on the hashing pool
+            password_hashes = school_auth.hash_passwords(
+                [student.password for student in students_to_add], school_auth.seed_password_hasher
+            )
+            for student, password_hash in zip(students_to_add, password_hashes):
+                student.password_hash = password_hash
+            db.add_all(students_to_add)
+            db.commit()
+
         print("\n" + "="*50)
         print("✓ SEEDING COMPLETED SUCCESSFULLY!")
         print("="*50)
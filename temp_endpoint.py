@@ -112,8 +112,7 @@ def generate_student_quiz(
             messages=[{"role": "user", "content": prompt}]
         )
         
-        text = clean_json_text(completion.choices[0].message.content)
-        quiz_json = json.loads(text)
+        quiz_json = parse_model_json(completion.choices[0].message.content)
         
     except Exception as e:
         print(f"Error generating quiz: {e}")